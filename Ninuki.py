@@ -14,6 +14,7 @@ from engine import GoEngine
 from typing import Any, Callable, Dict, List, Tuple
 import numpy as np
 from gtp_connection import point_to_coord, format_point
+from solver import Solver
 
 class Go0(GoEngine):
     def __init__(self) -> None:
@@ -23,17 +24,19 @@ class Go0(GoEngine):
         Passes only if there is no other legal move.
         """
         GoEngine.__init__(self, "Go0", 1.0)
+        # kept between solve calls, so the transposition table is reused
+        self.solver = Solver()
 
     def get_move(self, board: GoBoard, color: GO_COLOR) -> GO_POINT:
         return GoBoardUtil.generate_random_move(board, color, 
                                                 use_eye_filter=False)
     
-    def solve(self, board: GoBoard):
+    def solve(self, board: GoBoard, timelimit: float = 1.0):
         """
-        A2: Implement your search algorithm to solve a board
-        Change if deemed necessary
+        Solve the position for the side to move within timelimit seconds.
+        Returns (winner, move) as in Solver.solve, (None, None) if unknown.
         """
-        pass
+        return self.solver.solve(board, timelimit)
 
 def run() -> None:
     """
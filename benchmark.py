@@ -0,0 +1,236 @@
+"""
+benchmark.py
+Performance benchmarks for the board, policy and genmove hot paths.
+
+Run as
+
+    python3 -m benchmark [--sizes 5 7 9] [--output results.json]
+                         [--baseline benchmark_baseline.json] [--threshold 0.25]
+                         [--save-baseline]
+
+benchmark_baseline.json holds the results of the last accepted run, on
+the machine that made it. Timings only compare on the same machine, so
+regenerate the baseline with --save-baseline before comparing elsewhere.
+
+Every benchmark reports seconds per operation (lower is better), as the
+best of several repeats. Positions come from a corpus of games played
+from a fixed seed, so every run measures the same work.
+With --baseline, each result is compared to the one in the baseline
+file. The exit status is 1 if any result is slower than the baseline by
+more than threshold (a fraction, 0.25 means 25% slower).
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from board import GoBoard
+from board_base import BLACK, GO_COLOR
+from flat_monte_carlo import SimulationPlayer
+from policy_player import PolicyPlayer
+
+DEFAULT_SIZES: List[int] = [5, 7, 9, 13, 19]
+DEFAULT_BASELINE: str = "benchmark_baseline.json"
+DEFAULT_THRESHOLD: float = 0.25
+CORPUS_SEED: int = 455
+POLICY_CLASSES: List[str] = ['Win', 'BlockWin', 'OpenFour', 'Capture', 'Random']
+
+
+def make_corpus(size: int, num_games: int = 8) -> List[GoBoard]:
+    """
+    Every position before the end of num_games games between rule_based
+    players with some random moves mixed in, played from a fixed seed.
+    """
+    rng = random.Random("{}-{}".format(CORPUS_SEED, size))
+    policy_player = PolicyPlayer()
+    corpus = []
+    for _ in range(num_games):
+        board = GoBoard(size)
+        while not board.isGameOver():
+            corpus.append(board.copy())
+            color = board.current_player
+            _, moves = policy_player.get_policy_points(board, color, 'rule_based')
+            if rng.random() < 0.3:
+                moves = board.empty_points
+            board.play_move(rng.choice(sorted(moves)), color)
+    return corpus
+
+
+def time_per_op(run: Callable[[], int], repeat: int = 5, min_time: float = 0.1) -> float:
+    """
+    Seconds per operation, the best of repeat runs.
+    run does some operations and returns how many. It is called
+    repeatedly until min_time has passed in each run.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        ops = 0
+        start = time.perf_counter()
+        while True:
+            ops += run()
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        best = min(best, elapsed / ops)
+    return best
+
+
+def bench_board(corpus: List[GoBoard], results: Dict[str, float], prefix: str) -> None:
+    positions = corpus[::max(1, len(corpus) // 16)]
+
+    def play_undo() -> int:
+        ops = 0
+        for board in positions:
+            for move in board.empty_points[:8]:
+                board.play_move(move, board.current_player)
+                board.undo_move()
+                ops += 1
+        return ops
+    results[prefix + "play_move"] = time_per_op(play_undo)
+
+    def copy() -> int:
+        for board in positions:
+            board.copy()
+        return len(positions)
+    results[prefix + "copy"] = time_per_op(copy)
+
+    def game_over() -> int:
+        for board in positions:
+            board.isGameOver()
+        return len(positions)
+    results[prefix + "isGameOver"] = time_per_op(game_over)
+
+
+def bench_policy(corpus: List[GoBoard], results: Dict[str, float], prefix: str) -> None:
+    """ get_policy_moves latency for positions of each move class """
+    policy_player = PolicyPlayer()
+    by_class: Dict[str, List[Tuple[GoBoard, GO_COLOR]]] = {c: [] for c in POLICY_CLASSES}
+    for board in corpus:
+        moveType, _ = policy_player.get_policy_moves(board, board.current_player, 'rule_based')
+        by_class[moveType].append((board, board.current_player))
+    for moveType, positions in by_class.items():
+        if not positions:
+            continue
+        positions = positions[:32]
+
+        def policy_moves() -> int:
+            for board, color in positions:
+                # measure the scans, not the cached threat index
+                board.threats = [{}, {}, {}]
+                policy_player.get_policy_moves(board, color, 'rule_based')
+            return len(positions)
+        results[prefix + "policy_moves_" + moveType] = time_per_op(policy_moves)
+
+
+def bench_rollouts(corpus: List[GoBoard], results: Dict[str, float], prefix: str) -> None:
+    """ Seconds per rollout from the start of the corpus games """
+    simulation_player = SimulationPlayer()
+    starts = corpus[::max(1, len(corpus) // 4)][:4]
+    for policy in ['random', 'rule_based']:
+        random.seed(CORPUS_SEED)
+
+        def rollouts() -> int:
+            for board in starts:
+                depth = len(board.undo_stack)
+                simulation_player.simulate1(board, policy)
+                while len(board.undo_stack) > depth:
+                    board.undo_move()
+            return len(starts)
+        results[prefix + "rollout_" + policy] = time_per_op(rollouts, repeat=3, min_time=0.5)
+
+
+def bench_genmove(size: int, results: Dict[str, float], prefix: str) -> None:
+    """ End-to-end genmove on the empty board, 1 rollout per candidate """
+    for policy in ['random', 'rule_based']:
+        random.seed(CORPUS_SEED)
+        np.random.seed(CORPUS_SEED)
+        simulation_player = SimulationPlayer()
+        simulation_player.numSimulations = 1
+        board = GoBoard(size)
+
+        def genmove() -> int:
+            simulation_player.genmove(board, BLACK, policy)
+            return 1
+        results[prefix + "genmove_" + policy] = time_per_op(genmove, repeat=2, min_time=0.5)
+
+
+def run_benchmarks(sizes: List[int]) -> Dict[str, float]:
+    results: Dict[str, float] = {}
+    for size in sizes:
+        corpus = make_corpus(size)
+        prefix = "{}x{}/".format(size, size)
+        bench_board(corpus, results, prefix)
+        bench_policy(corpus, results, prefix)
+        bench_rollouts(corpus, results, prefix)
+        bench_genmove(size, results, prefix)
+    return results
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float],
+            threshold: float) -> List[Tuple[str, float, float]]:
+    """ (name, baseline, result) for every result slower than allowed """
+    regressions = []
+    for name, seconds in sorted(results.items()):
+        if name in baseline and seconds > baseline[name] * (1 + threshold):
+            regressions.append((name, baseline[name], seconds))
+    return regressions
+
+
+def load_results(path: str) -> Dict[str, float]:
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def write_results(path: str, results: Dict[str, float]) -> None:
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline",
+                        help="compare with the results in this JSON file, "
+                             "for example " + DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown against the baseline, as a fraction")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="write the results to the baseline file instead of comparing")
+    args = parser.parse_args(argv)
+    if args.save_baseline and not args.baseline:
+        parser.error("--save-baseline needs --baseline")
+
+    results = run_benchmarks(args.sizes)
+    for name, seconds in sorted(results.items()):
+        print("{:40s} {:12.2f} us".format(name, seconds * 1e6))
+    if args.output:
+        write_results(args.output, results)
+    if args.save_baseline:
+        write_results(args.baseline, results)
+        return 0
+    if args.baseline:
+        regressions = compare(results, load_results(args.baseline), args.threshold)
+        for name, before, after in regressions:
+            print("REGRESSION {}: {:.2f} us -> {:.2f} us ({:+.0%})".format(
+                name, before * 1e6, after * 1e6, after / before - 1))
+        if regressions:
+            return 1
+        print("no regressions against {} (threshold {:.0%})".format(args.baseline, args.threshold))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
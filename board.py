@@ -12,14 +12,16 @@ The board uses a 1-dimensional representation with padding
 """
 
 import numpy as np
-from typing import List, Tuple
+import random
+from typing import Dict, List, Tuple
 
 from board_base import (
-    board_array_size,
+    bits_to_points,
     coord_to_point,
     is_black_white,
     is_black_white_empty,
     opponent,
+    shift_bits,
     where1d,
     BLACK,
     WHITE,
@@ -31,6 +33,8 @@ from board_base import (
     GO_COLOR,
     GO_POINT,
 )
+from board_geometry import BoardGeometry, get_geometry
+from zobrist import get_zobrist_table
 
 
 """
@@ -41,6 +45,11 @@ For many more utility functions, see the GoBoardUtil class in board_util.py.
 
 The board is stored as a one-dimensional array of GO_POINT in self.board.
 See coord_to_point for explanations of the array encoding.
+The same position is also kept as one bitboard per color in self.bitboards,
+indexed by EMPTY, BLACK and WHITE. Bit p is set if point p has that color.
+The BORDER padding keeps lines from wrapping around the board edge, so
+five in a row, fours and captures are found with shifts along the four
+line directions, without looking at single points.
 """
 class GoBoard(object):
     def __init__(self, size: int) -> None:
@@ -49,11 +58,10 @@ class GoBoard(object):
         """
         assert 2 <= size <= MAXSIZE
         self.reset(size)
-        self.calculate_rows_cols_diags()
-        self.black_captures = 0
-        self.white_captures = 0
 
     def add_two_captures(self, color: GO_COLOR) -> None:
+        count = self.get_captures(color)
+        self.hash_key ^= self.zobrist.captures(color, count) ^ self.zobrist.captures(color, count + 2)
         if color == BLACK:
             self.black_captures += 2
         elif color == WHITE:
@@ -65,95 +73,129 @@ class GoBoard(object):
             return self.white_captures
     
     def calculate_rows_cols_diags(self) -> None:
-        if self.size < 5:
-            return
-        # precalculate all rows, cols, and diags for 5-in-a-row detection
-        self.rows = []
-        self.cols = []
-        for i in range(1, self.size + 1):
-            current_row = []
-            start = self.row_start(i)
-            for pt in range(start, start + self.size):
-                current_row.append(pt)
-            self.rows.append(current_row)
-            
-            start = self.row_start(1) + i - 1
-            current_col = []
-            for pt in range(start, self.row_start(self.size) + i, self.NS):
-                current_col.append(pt)
-            self.cols.append(current_col)
-        
-        self.diags = []
-        # diag towards SE, starting from first row (1,1) moving right to (1,n)
-        start = self.row_start(1)
-        for i in range(start, start + self.size):
-            diag_SE = []
-            pt = i
-            while self.get_color(pt) == EMPTY:
-                diag_SE.append(pt)
-                pt += self.NS + 1
-            if len(diag_SE) >= 5:
-                self.diags.append(diag_SE)
-        # diag towards SE and NE, starting from (2,1) downwards to (n,1)
-        for i in range(start + self.NS, self.row_start(self.size) + 1, self.NS):
-            diag_SE = []
-            diag_NE = []
-            pt = i
-            while self.get_color(pt) == EMPTY:
-                diag_SE.append(pt)
-                pt += self.NS + 1
-            pt = i
-            while self.get_color(pt) == EMPTY:
-                diag_NE.append(pt)
-                pt += -1 * self.NS + 1
-            if len(diag_SE) >= 5:
-                self.diags.append(diag_SE)
-            if len(diag_NE) >= 5:
-                self.diags.append(diag_NE)
-        # diag towards NE, starting from (n,2) moving right to (n,n)
-        start = self.row_start(self.size) + 1
-        for i in range(start, start + self.size):
-            diag_NE = []
-            pt = i
-            while self.get_color(pt) == EMPTY:
-                diag_NE.append(pt)
-                pt += -1 * self.NS + 1
-            if len(diag_NE) >=5:
-                self.diags.append(diag_NE)
-        assert len(self.rows) == self.size
-        assert len(self.cols) == self.size
-        assert len(self.diags) == (2 * (self.size - 5) + 1) * 2
+        """
+        rows, cols and diags for 5-in-a-row detection, and the first
+        windows used by consecutive_fours_bits. They are computed once
+        per size in board_geometry.py and shared by all boards.
+        """
+        geometry = self.geometry
+        self.rows: List[List[int]] = geometry.rows
+        self.cols: List[List[int]] = geometry.cols
+        self.diags: List[List[int]] = geometry.diags
+        self.first_windows: Dict[int, Dict[int, int]] = geometry.first_windows
+        self.first_windows_bits: Dict[int, int] = geometry.first_windows_bits
 
     def reset(self, size: int) -> None:
         """
         Creates a start state, an empty board with given size.
         """
+        geometry = get_geometry(size)
+        self.geometry: BoardGeometry = geometry
         self.size: int = size
-        self.NS: int = size + 1
-        self.WE: int = 1
+        self.NS: int = geometry.NS
+        self.WE: int = geometry.WE
         self.ko_recapture: GO_POINT = NO_POINT
         self.last_move: GO_POINT = NO_POINT
         self.last2_move: GO_POINT = NO_POINT
         self.current_player: GO_COLOR = BLACK
-        self.maxpoint: int = board_array_size(size)
-        self.board: np.ndarray[GO_POINT] = np.full(self.maxpoint, BORDER, dtype=GO_POINT)
-        self._initialize_empty_points(self.board)
+        self.maxpoint: int = geometry.maxpoint
+        self.board: np.ndarray[GO_POINT] = geometry.empty_board.copy()
+        self.line_directions: List[int] = geometry.line_directions
+        self.bitboards: List[int] = [geometry.empty_bits, 0, 0]
         self.calculate_rows_cols_diags()
         self.black_captures = 0
         self.white_captures = 0
+        # game status maintained incrementally by play_move
+        self.five_winner: GO_COLOR = EMPTY
+        # empty points in no particular order, and the index of each
+        # point in that list (-1 if not empty), for O(1) updates
+        self.empty_points: List[int] = geometry.points.copy()
+        self.empty_index: List[int] = geometry.empty_index.copy()
+        # one record per play_move, see undo_move
+        self.undo_stack: List[Tuple] = []
+        # Zobrist hash of stones, side to move and capture counts, see hash()
+        self.zobrist = get_zobrist_table(size)
+        self.hash_key: int = 0
+        # threat bitboards of the current position, filled on first use,
+        # see threat_bits
+        self.threats: List[Dict[str, int]] = [{}, {}, {}]
 
     def copy(self) -> 'GoBoard':
-        b = GoBoard(self.size)
-        assert b.NS == self.NS
-        assert b.WE == self.WE
-        b.ko_recapture = self.ko_recapture
-        b.last_move = self.last_move
-        b.last2_move = self.last2_move
-        b.current_player = self.current_player
-        assert b.maxpoint == self.maxpoint
-        b.board = np.copy(self.board)
+        """
+        Copy of the position and move history.
+        Only the mutable state is copied, the layout data is shared.
+        """
+        b = GoBoard.__new__(GoBoard)
+        b.__dict__.update(self.__dict__)
+        b.board = self.board.copy()
+        b.bitboards = self.bitboards.copy()
+        b.empty_points = self.empty_points.copy()
+        b.empty_index = self.empty_index.copy()
+        b.undo_stack = self.undo_stack.copy()
+        b.threats = [cache.copy() for cache in self.threats]
         return b
 
+    def set_position(self, board_array: np.ndarray, black_captures: int,
+                     white_captures: int, current_player: GO_COLOR) -> None:
+        """
+        Set up the position given by a padded board array of the same size,
+        for example one received from another process.
+        The move history is not known, so last moves and undo_stack are cleared.
+        """
+        self.reset(self.size)
+        for point in where1d(board_array != EMPTY):
+            color = board_array[point]
+            if color == BORDER:
+                continue
+            point = int(point)
+            self.board[point] = color
+            self.bitboards[EMPTY] ^= 1 << point
+            self.bitboards[color] |= 1 << point
+            self._remove_empty_point(point)
+        self.black_captures = black_captures
+        self.white_captures = white_captures
+        self.current_player = current_player
+        self.five_winner = self.detect_five_in_a_row()
+        self.hash_key = self.compute_hash()
+
+    def hash(self) -> int:
+        """
+        64 bit Zobrist hash of the position: stones, side to move and
+        capture counts. It is updated incrementally by play_move.
+        """
+        return self.hash_key
+
+    def canonical_hash(self) -> Tuple[int, int]:
+        """
+        The smallest hash of the eight symmetric images of the position,
+        and the symmetry s that gives it: the position is the same as any
+        other position with the same canonical hash, after mapping its
+        points p to geometry.symmetries[s][p].
+        """
+        keys = self.zobrist.stone_array[self.board[None, :], self.geometry.symmetries]
+        stone_hashes = np.bitwise_xor.reduce(keys, axis=1).tolist()
+        # side to move and captures do not change under symmetry
+        rest = self.hash_key ^ stone_hashes[0]
+        hashes = [h ^ rest for h in stone_hashes]
+        s = min(range(8), key=hashes.__getitem__)
+        return hashes[s], s
+
+    def symmetries(self) -> List[int]:
+        """ The symmetries that leave the position unchanged, 0 first """
+        images = self.board[self.geometry.inverse_symmetries]
+        return [s for s in range(8) if np.array_equal(images[s], self.board)]
+
+    def compute_hash(self) -> int:
+        """ Zobrist hash computed from scratch, see hash() """
+        key = 0
+        for color in [BLACK, WHITE]:
+            for point in bits_to_points(self.bitboards[color]):
+                key ^= self.zobrist.stones[color][point]
+            key ^= self.zobrist.captures(color, self.get_captures(color))
+        if self.current_player == WHITE:
+            key ^= self.zobrist.white_to_move
+        return key
+
     def get_color(self, point: GO_POINT) -> GO_COLOR:
         return self.board[point]
 
@@ -184,13 +226,14 @@ class GoBoard(object):
     def is_legal(self, point: GO_POINT, color: GO_COLOR) -> bool:
         """
         Check whether it is legal for color to play on point
-        This method tries to play the move on a temporary copy of the board.
-        This prevents the board from being modified by the move
+        This method tries to play the move and then takes it back
+        with undo_move, so the board is left unchanged
         """
         if point == PASS:
             return True
-        board_copy: GoBoard = self.copy()
-        can_play_move = board_copy.play_move(point, color)
+        can_play_move = self.play_move(point, color)
+        if can_play_move:
+            self.undo_move()
         return can_play_move
 
     def end_of_game(self) -> bool:
@@ -202,7 +245,30 @@ class GoBoard(object):
         Return:
             The empty points on the board
         """
-        return where1d(self.board == EMPTY)
+        return np.array(self.empty_points, dtype=GO_POINT)
+
+    def random_empty_point(self) -> GO_POINT:
+        """
+        Return a uniformly random empty point, or PASS if the board is full
+        """
+        if not self.empty_points:
+            return PASS
+        return random.choice(self.empty_points)
+
+    def _add_empty_point(self, point: int) -> None:
+        self.empty_index[point] = len(self.empty_points)
+        self.empty_points.append(point)
+
+    def _remove_empty_point(self, point: int) -> None:
+        """
+        Remove point from empty_points by moving the last point into its slot
+        """
+        i = self.empty_index[point]
+        last = self.empty_points.pop()
+        if last != point:
+            self.empty_points[i] = last
+            self.empty_index[last] = i
+        self.empty_index[point] = -1
 
     def row_start(self, row: int) -> int:
         assert row >= 1
@@ -311,40 +377,110 @@ class GoBoard(object):
         """
         if self.board[point] != EMPTY:
             return False
+        # plain int, numpy integers overflow when shifted into a bitboard
+        point = int(point)
+        undo_record = (point, self.last_move, self.last2_move,
+                       self.current_player, self.five_winner, self.hash_key, [],
+                       self.threats)
+        self.undo_stack.append(undo_record)
+        self.threats = [{}, {}, {}]
         self.board[point] = color
+        self.bitboards[EMPTY] ^= 1 << point
+        self.bitboards[color] |= 1 << point
+        self._remove_empty_point(point)
+        zobrist = self.zobrist
+        self.hash_key ^= zobrist.stones[color][point]
+        if self.current_player == WHITE:
+            self.hash_key ^= zobrist.white_to_move
+        if color == BLACK:
+            self.hash_key ^= zobrist.white_to_move
         self.current_player = opponent(color)
         self.last2_move = self.last_move
         self.last_move = point
         O = opponent(color)
-        offsets = [1, -1, self.NS, -self.NS, self.NS+1, -(self.NS+1), self.NS-1, -self.NS+1]
-        for offset in offsets:
-            if self.board[point+offset] == O and self.board[point+(offset*2)] == O and self.board[point+(offset*3)] == color:
-                self.board[point+offset] = EMPTY
-                self.board[point+(offset*2)] = EMPTY
+        own_bits = self.bitboards[color]
+        captured = False
+        for p1, p2, p3, pair in self.geometry.capture_rays[point]:
+            if self.bitboards[O] & pair == pair and (own_bits >> p3) & 1:
+                self.board[p1] = EMPTY
+                self.board[p2] = EMPTY
+                self.bitboards[O] ^= pair
+                self.bitboards[EMPTY] |= pair
+                self._add_empty_point(p1)
+                self._add_empty_point(p2)
+                undo_record[6].extend([p1, p2])
+                self.hash_key ^= zobrist.stones[O][p1] ^ zobrist.stones[O][p2]
+                captured = True
+                count = self.get_captures(color)
+                self.hash_key ^= zobrist.captures(color, count) ^ zobrist.captures(color, count + 2)
                 if color == BLACK:
                     self.black_captures += 2
                 else:
                     self.white_captures += 2
+        # a capture can only break a five of the opponent, so only then
+        # the whole board needs to be scanned again
+        if captured and self.five_winner == O:
+            self.five_winner = self.detect_five_in_a_row()
+        if self.five_winner == EMPTY and self._is_five_through(point, color):
+            self.five_winner = color
         return True
-    
-    def neighbors_of_color(self, point: GO_POINT, color: GO_COLOR) -> List:
-        """ List of neighbors of point of given color """
-        nbc: List[GO_POINT] = []
-        for nb in self._neighbors(point):
-            if self.get_color(nb) == color:
-                nbc.append(nb)
-        return nbc
 
-    def _neighbors(self, point: GO_POINT) -> List:
-        """ List of all four neighbors of the point """
-        return [point - 1, point + 1, point - self.NS, point + self.NS]
+    def undo_move(self) -> None:
+        """
+        Take back the last move made by play_move, including the stones
+        it captured, the capture count and the game status.
+        """
+        point, last_move, last2_move, current_player, five_winner, hash_key, captured, \
+            threats = self.undo_stack.pop()
+        color: GO_COLOR = self.board[point]
+        O = opponent(color)
+        self.board[point] = EMPTY
+        self.bitboards[color] ^= 1 << point
+        self.bitboards[EMPTY] |= 1 << point
+        self._add_empty_point(point)
+        for stone in captured:
+            self.board[stone] = O
+            self.bitboards[O] |= 1 << stone
+            self.bitboards[EMPTY] ^= 1 << stone
+            self._remove_empty_point(stone)
+        if color == BLACK:
+            self.black_captures -= len(captured)
+        else:
+            self.white_captures -= len(captured)
+        self.last_move = last_move
+        self.last2_move = last2_move
+        self.current_player = current_player
+        self.five_winner = five_winner
+        self.hash_key = hash_key
+        self.threats = threats
 
-    def _diag_neighbors(self, point: GO_POINT) -> List:
-        """ List of all four diagonal neighbors of point """
-        return [point - self.NS - 1,
-                point - self.NS + 1,
-                point + self.NS - 1,
-                point + self.NS + 1]
+    def _is_five_through(self, point: GO_POINT, color: GO_COLOR) -> bool:
+        """
+        Check whether the stone of color on point is part of a five in a row.
+        Only the four lines through point are examined.
+        """
+        stones = self.bitboards[color]
+        for forward, backward in self.geometry.line_rays[point]:
+            count = 1
+            for pt in forward:
+                if not (stones >> pt) & 1:
+                    break
+                count += 1
+            for pt in backward:
+                if not (stones >> pt) & 1:
+                    break
+                count += 1
+            if count >= 5:
+                return True
+        return False
+    
+    def _neighbors(self, point: GO_POINT) -> Tuple[GO_POINT, ...]:
+        """ All four neighbors of the point """
+        return self.geometry.neighbors[point]
+
+    def _diag_neighbors(self, point: GO_POINT) -> Tuple[GO_POINT, ...]:
+        """ All four diagonal neighbors of point """
+        return self.geometry.diag_neighbors[point]
 
     def last_board_moves(self) -> List:
         """
@@ -363,20 +499,20 @@ class GoBoard(object):
         Returns BLACK or WHITE if any five in a row is detected for the color
         EMPTY otherwise.
         """
-        for r in self.rows:
-            result = self.has_five_in_list(r)
-            if result != EMPTY:
-                return result
-        for c in self.cols:
-            result = self.has_five_in_list(c)
-            if result != EMPTY:
-                return result
-        for d in self.diags:
-            result = self.has_five_in_list(d)
-            if result != EMPTY:
-                return result
+        for color in [BLACK, WHITE]:
+            stones = self.bitboards[color]
+            for d in self.line_directions:
+                if self._runs_of_four(stones, d) & (stones >> (4 * d)):
+                    return color
         return EMPTY
 
+    def _runs_of_four(self, stones: int, d: int) -> int:
+        """
+        Bitboard of all points p such that p, p+d, p+2d and p+3d are in stones.
+        """
+        pairs = stones & (stones >> d)
+        return pairs & (pairs >> (2 * d))
+
     def has_five_in_list(self, list) -> GO_COLOR:
         """
         Returns BLACK or WHITE if any five in a rows exist in the list.
@@ -395,18 +531,142 @@ class GoBoard(object):
         return EMPTY
     
     def getConsecutiveFours(self, color):
-        consecutiveFours = set()
-        for r in self.rows:
-            #print([self.get_color(i) for i in r])
-            #print(self.find_consecutive_4_in_list(r, color))
-            consecutiveFours = consecutiveFours.union(self.find_consecutive_4_in_list(r, color))
-        for c in self.cols:
-            consecutiveFours = consecutiveFours.union(self.find_consecutive_4_in_list(c, color))
-        for d in self.diags:
-            consecutiveFours = consecutiveFours.union(self.find_consecutive_4_in_list(d, color))
-        #print(consecutiveFours)
-        return consecutiveFours
-    
+        return set(bits_to_points(self.consecutive_fours_bits(color)))
+
+    def threat_bits(self, color: GO_COLOR, kind: str) -> int:
+        """
+        Threat bitboard of color in the current position, one of
+        'win' (win_points_bits), 'fours' (consecutive_fours_bits),
+        'capture' (capture_points_bits) and 'open_four' (open_four_points_bits).
+        Each is computed on first use and kept until the position changes.
+        undo_move restores the threats of the previous position, so
+        searches that go back and forth do not compute them again.
+        """
+        cache = self.threats[color]
+        bits = cache.get(kind)
+        if bits is None:
+            bits = cache[kind] = self._threat_functions[kind](self, color)
+        return bits
+
+    def is_dead_draw(self) -> bool:
+        """
+        True if the game can only end in a draw: no capture can ever
+        happen, and every five-window holds stones of both colors.
+        A capture needs a move at an empty point p with X-O-O-X formed
+        by p and the three points beyond it in some direction. If no
+        empty point has three points beyond it that can still become
+        O, O and X, stones are only ever added, so blocked windows stay
+        blocked and the capture counts stay as they are.
+        """
+        values = np.take(self.board, self.geometry.five_windows)
+        for color in [BLACK, WHITE]:
+            if ((values == color) | (values == EMPTY)).all(axis=1).any():
+                return False
+        rays = np.take(self.board, self.geometry.capture_windows[self.empty_points])
+        first, second, third = rays[..., 0], rays[..., 1], rays[..., 2]
+        for color in [BLACK, WHITE]:
+            pair = ((first == EMPTY) | (first == color)) & ((second == EMPTY) | (second == color))
+            if (pair & ((third == EMPTY) | (third == opponent(color)))).any():
+                return False
+        return True
+
+    def consecutive_fours_bits(self, color: GO_COLOR) -> int:
+        """
+        Bitboard of all stones of color that are part of four in a row
+        with an empty point on at least one end.
+        """
+        return self.threat_bits(color, 'fours')
+
+    def _consecutive_fours_bits(self, color: GO_COLOR) -> int:
+        stones = self.bitboards[color]
+        empty = self.bitboards[EMPTY]
+        result = 0
+        for d in self.line_directions:
+            runs = self._runs_of_four(stones, d)
+            fours = runs & ((empty << d) | (empty >> (4 * d)))
+            for start in bits_to_points(runs & self.first_windows_bits[d]):
+                if (empty >> self.first_windows[d][start]) & 1:
+                    fours |= 1 << start
+            result |= fours | (fours << d) | (fours << (2 * d)) | (fours << (3 * d))
+        return result
+
+    def win_points_bits(self, color: GO_COLOR) -> int:
+        """
+        Bitboard of the empty points where color completes five in a row.
+        """
+        return self.threat_bits(color, 'win')
+
+    def _win_points_bits(self, color: GO_COLOR) -> int:
+        stones = self.bitboards[color]
+        wins = 0
+        for d in self.line_directions:
+            a1 = stones >> d
+            a12 = a1 & (stones >> (2 * d))
+            a3 = stones >> (3 * d)
+            b1 = stones << d
+            b12 = b1 & (stones << (2 * d))
+            b3 = stones << (3 * d)
+            wins |= (a12 & a3 & (stones >> (4 * d))) | (b1 & a12 & a3) \
+                | (b12 & a12) | (b12 & b3 & a1) | (b12 & b3 & (stones << (4 * d)))
+        return wins & self.bitboards[EMPTY]
+
+    def capture_points_bits(self, color: GO_COLOR, targets: int = -1) -> int:
+        """
+        Bitboard of the empty points where color captures a pair X-O-O-X.
+        If targets is given, only captures which remove at least one
+        stone in targets are included.
+        """
+        if targets == -1:
+            return self.threat_bits(color, 'capture')
+        return self._capture_points_bits(color, targets)
+
+    def _capture_points_bits(self, color: GO_COLOR, targets: int = -1) -> int:
+        own = self.bitboards[color]
+        opp = self.bitboards[opponent(color)]
+        captures = 0
+        for d in self.line_directions:
+            for offset in [d, -d]:
+                pair = shift_bits(opp, offset) & shift_bits(opp, 2 * offset)
+                hit = shift_bits(targets, offset) | shift_bits(targets, 2 * offset)
+                captures |= pair & hit & shift_bits(own, 3 * offset)
+        return captures & self.bitboards[EMPTY]
+
+    def open_four_points_bits(self, color: GO_COLOR) -> int:
+        """
+        Bitboard of the empty points where color makes exactly four in a row,
+        with the point next to the new stone beyond the line still empty.
+        The direction is taken from a neighbor stone of color, as in the
+        original point by point scan: with the neighbor on side +d, the run
+        on side -d must be followed by an empty point.
+        """
+        return self.threat_bits(color, 'open_four')
+
+    def _open_four_points_bits(self, color: GO_COLOR) -> int:
+        own = self.bitboards[color]
+        empty = self.bitboards[EMPTY]
+        not_own = ((1 << self.maxpoint) - 1) & ~own
+        result = 0
+        for d in self.line_directions:
+            for offset in [d, -d]:
+                s1 = shift_bits(own, offset)
+                s2 = shift_bits(own, 2 * offset)
+                m1 = shift_bits(own, -offset)
+                # (stones on + side, stones on - side) = (3, 0), (2, 1), (1, 2)
+                result |= s1 & s2 & shift_bits(own, 3 * offset) \
+                    & shift_bits(not_own, 4 * offset) & shift_bits(empty, -offset)
+                result |= s1 & s2 & shift_bits(not_own, 3 * offset) \
+                    & m1 & shift_bits(empty, -2 * offset)
+                result |= s1 & shift_bits(not_own, 2 * offset) \
+                    & m1 & shift_bits(own, -2 * offset) & shift_bits(empty, -3 * offset)
+        return result & empty
+
+    _threat_functions = {
+        'win': _win_points_bits,
+        'fours': _consecutive_fours_bits,
+        'capture': _capture_points_bits,
+        'open_four': _open_four_points_bits,
+    }
+
     def find_consecutive_4_in_list(self, lst, color):
         consecutiveFour = set()
         for i in range(len(lst)):
@@ -426,24 +686,18 @@ class GoBoard(object):
         return consecutiveFour
 
     def neighbors_of_color(self, point: GO_POINT, color: GO_COLOR) -> List:
-        """ List of neighbors of point of given color """
-        nbc: List[GO_POINT] = []
-        neighbors = self._neighbors(point) + self._diag_neighbors(point)
-        for nb in neighbors:
-            if self.get_color(nb) == color:
-                nbc.append(nb)
-        return nbc
+        """ List of the eight neighbors of point of given color """
+        board = self.board
+        return [nb for nb in self.geometry.neighbors8[point] if board[nb] == color]
     
 
     def isGameOver(self):
-        return self.end_of_game() or self.detect_five_in_a_row() != EMPTY or self.boardIsFull() or self.black_captures >= 10 or self.white_captures >= 10
+        return self.end_of_game() or self.five_winner != EMPTY or self.boardIsFull() or self.black_captures >= 10 or self.white_captures >= 10
     
     def evalEndState(self):
         #print(color)
-        if self.detect_five_in_a_row() == BLACK:
-            return BLACK
-        elif self.detect_five_in_a_row() == WHITE:
-            return WHITE
+        if self.five_winner != EMPTY:
+            return self.five_winner
         elif self.black_captures >=10:
             return BLACK
         elif self.white_captures >=10:
@@ -452,4 +706,4 @@ class GoBoard(object):
     
 
     def boardIsFull(self):
-        return not EMPTY in self.board
\ No newline at end of file
+        return not self.empty_points
\ No newline at end of file
@@ -6,6 +6,7 @@ This file is imported by board.py.
 
 import numpy as np
 import random
+from typing import List
 
 """
 Encoding of colors on and off a Go board.
@@ -69,6 +70,28 @@ The [0] indexing is needed to extract the ndarray result from the singleton tupl
 def where1d(condition: np.ndarray) -> np.ndarray:
     return np.where(condition)[0]
 
+"""
+Bitboards: a set of points is stored as one Python int,
+with bit i set if array index i (see coord_to_point) is in the set.
+shift_bits moves a bitboard by a (possibly negative) point offset:
+bit p of the result is set if bit p + offset is set in bits.
+"""
+def shift_bits(bits: int, offset: int) -> int:
+    if offset >= 0:
+        return bits >> offset
+    return bits << -offset
+
+def bits_to_points(bits: int) -> List[int]:
+    """
+    Return the points of a bitboard in increasing order.
+    """
+    points: List[int] = []
+    while bits:
+        lowest = bits & -bits
+        points.append(lowest.bit_length() - 1)
+        bits ^= lowest
+    return points
+
 def coord_to_point(row: int, col: int, board_size: int) -> GO_POINT:
     """
     Transform two dimensional (row, col) representation to array index.
@@ -0,0 +1,231 @@
+"""
+board_geometry.py
+Layout data of a GoBoard that depends only on the board size.
+
+The lines used for 5-in-a-row detection, the line directions, the
+neighbor tables and the empty start position are computed once per
+size and shared by all boards of that size. Boards must treat these
+lists as read-only.
+"""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from board_base import (
+    board_array_size,
+    where1d,
+    EMPTY,
+    BORDER,
+    GO_POINT,
+)
+
+
+class BoardGeometry(object):
+    def __init__(self, size: int) -> None:
+        self.size: int = size
+        self.NS: int = size + 1
+        self.WE: int = 1
+        self.maxpoint: int = board_array_size(size)
+        self.line_directions: List[int] = [self.WE, self.NS, self.NS + 1, self.NS - 1]
+        # empty board, BORDER around it
+        self.empty_board: np.ndarray = np.full(self.maxpoint, BORDER, dtype=GO_POINT)
+        for row in range(1, size + 1):
+            start = self.row_start(row)
+            self.empty_board[start : start + size] = EMPTY
+        self.points: List[int] = [int(p) for p in where1d(self.empty_board == EMPTY)]
+        self.empty_bits: int = 0
+        # index of each point in points, -1 for BORDER points
+        self.empty_index: List[int] = [-1] * self.maxpoint
+        for i, point in enumerate(self.points):
+            self.empty_bits |= 1 << point
+            self.empty_index[point] = i
+        self._calculate_neighbors()
+        self.rows: List[List[int]] = []
+        self.cols: List[List[int]] = []
+        self.diags: List[List[int]] = []
+        self.first_windows: Dict[int, Dict[int, int]] = {d: {} for d in self.line_directions}
+        self.first_windows_bits: Dict[int, int] = {d: 0 for d in self.line_directions}
+        if size >= 5:
+            self._calculate_rows_cols_diags()
+            self._calculate_first_windows()
+        self._calculate_windows()
+        self._calculate_symmetries()
+
+    def _calculate_neighbors(self) -> None:
+        """
+        Neighbor and ray tables, one tuple per point.
+        neighbors, diag_neighbors, neighbors8: the four, four diagonal and
+            all eight neighbors. They are given for every array index, as
+            plain offsets, so border points get them too.
+        capture_rays: for each of the eight directions o from a board point,
+            (p+o, p+2o, p+3o, pair) where pair is the bitboard of the first
+            two points. Directions that leave the board are left out.
+        line_rays: for each line direction d, the up to four board points
+            p+d .. p+4d and the up to four board points p-d .. p-4d.
+        """
+        NS = self.NS
+        on_board = [False] * self.maxpoint
+        for p in self.points:
+            on_board[p] = True
+        self.neighbors: List[Tuple[int, ...]] = [
+            (p - 1, p + 1, p - NS, p + NS) for p in range(self.maxpoint)]
+        self.diag_neighbors: List[Tuple[int, ...]] = [
+            (p - NS - 1, p - NS + 1, p + NS - 1, p + NS + 1) for p in range(self.maxpoint)]
+        self.neighbors8: List[Tuple[int, ...]] = [
+            self.neighbors[p] + self.diag_neighbors[p] for p in range(self.maxpoint)]
+        offsets = [1, -1, NS, -NS, NS + 1, -(NS + 1), NS - 1, -NS + 1]
+        self.capture_rays: List[Tuple[Tuple[int, int, int, int], ...]] = [()] * self.maxpoint
+        self.line_rays: List[Tuple[Tuple[Tuple[int, ...], Tuple[int, ...]], ...]] = \
+            [()] * self.maxpoint
+        for p in self.points:
+            rays = []
+            for o in offsets:
+                ray = [p + k * o for k in range(1, 4)]
+                if all(on_board[q] for q in ray):
+                    rays.append((ray[0], ray[1], ray[2], (1 << ray[0]) | (1 << ray[1])))
+            self.capture_rays[p] = tuple(rays)
+            self.line_rays[p] = tuple((self._ray(p, d, on_board), self._ray(p, -d, on_board))
+                                      for d in self.line_directions)
+
+    def _ray(self, point: int, step: int, on_board: List[bool]) -> Tuple[int, ...]:
+        """ Up to four board points from point in direction step """
+        ray = []
+        point += step
+        while len(ray) < 4 and on_board[point]:
+            ray.append(point)
+            point += step
+        return tuple(ray)
+
+    def row_start(self, row: int) -> int:
+        return row * self.NS + 1
+
+    def _on_board(self, point: int) -> bool:
+        return self.empty_board[point] == EMPTY
+
+    def _calculate_rows_cols_diags(self) -> None:
+        # precalculate all rows, cols, and diags for 5-in-a-row detection
+        size = self.size
+        for i in range(1, size + 1):
+            start = self.row_start(i)
+            self.rows.append(list(range(start, start + size)))
+            start = self.row_start(1) + i - 1
+            self.cols.append(list(range(start, self.row_start(size) + i, self.NS)))
+        # diag towards SE, starting from first row (1,1) moving right to (1,n)
+        start = self.row_start(1)
+        for i in range(start, start + size):
+            diag_SE = self._line_from(i, self.NS + 1)
+            if len(diag_SE) >= 5:
+                self.diags.append(diag_SE)
+        # diag towards SE and NE, starting from (2,1) downwards to (n,1)
+        for i in range(start + self.NS, self.row_start(size) + 1, self.NS):
+            diag_SE = self._line_from(i, self.NS + 1)
+            diag_NE = self._line_from(i, -self.NS + 1)
+            if len(diag_SE) >= 5:
+                self.diags.append(diag_SE)
+            if len(diag_NE) >= 5:
+                self.diags.append(diag_NE)
+        # diag towards NE, starting from (n,2) moving right to (n,n)
+        start = self.row_start(size) + 1
+        for i in range(start, start + size):
+            diag_NE = self._line_from(i, -self.NS + 1)
+            if len(diag_NE) >= 5:
+                self.diags.append(diag_NE)
+        assert len(self.rows) == size
+        assert len(self.cols) == size
+        assert len(self.diags) == (2 * (size - 5) + 1) * 2
+
+    def _line_from(self, point: int, step: int) -> List[int]:
+        """ Points from point in direction step up to the board edge """
+        line = []
+        while self._on_board(point):
+            line.append(point)
+            point += step
+        return line
+
+    def _calculate_first_windows(self) -> None:
+        """
+        find_consecutive_4_in_list checks lst[i-1] for the first window
+        of a line, which Python resolves to the last point of the line.
+        Record for each direction the first windows of lines longer than
+        five, keyed by their lowest point, together with that last point,
+        so consecutive_fours_bits gives the same result.
+        """
+        for line in self.rows + self.cols + self.diags:
+            if len(line) <= 5:
+                continue
+            d = abs(line[1] - line[0])
+            start = min(line[0], line[3])
+            self.first_windows[d][start] = line[-1]
+            self.first_windows_bits[d] |= 1 << start
+
+    def _calculate_windows(self) -> None:
+        """
+        Index matrices for evaluating many points or many boards at once
+        with NumPy fancy indexing (np.take or boards[:, index]).
+        five_windows: one row per window of five points on a line.
+        point_windows: for each point, the rows of five_windows through it,
+            padded with the extra last row, which holds only point 0 (BORDER).
+        capture_windows: for each point and each of the eight offsets o,
+            the points p+o, p+2o and p+3o of an X-O-O-X capture,
+            with 0 (BORDER) for points outside the array.
+        line_windows: for each point and line direction, the four points
+            on either side, used for the local patterns of pattern_policy.py.
+        """
+        windows = [line[i:i + 5] for line in self.rows + self.cols + self.diags
+                   for i in range(len(line) - 4)]
+        through: List[List[int]] = [[] for _ in range(self.maxpoint)]
+        for w, window in enumerate(windows):
+            for point in window:
+                through[point].append(w)
+        windows.append([0] * 5)
+        self.five_windows: np.ndarray = np.array(windows, dtype=np.intp).reshape(-1, 5)
+        self.point_windows: np.ndarray = np.full((self.maxpoint, 20), len(windows) - 1, dtype=np.intp)
+        for point, ws in enumerate(through):
+            self.point_windows[point, :len(ws)] = ws
+        offsets = [self.WE, -self.WE, self.NS, -self.NS,
+                   self.NS + 1, -(self.NS + 1), self.NS - 1, -(self.NS - 1)]
+        steps = np.array([[o, 2 * o, 3 * o] for o in offsets], dtype=np.intp)
+        capture = np.arange(self.maxpoint, dtype=np.intp)[:, None, None] + steps[None, :, :]
+        capture[(capture < 0) | (capture >= self.maxpoint)] = 0
+        self.capture_windows: np.ndarray = capture
+        steps = np.array([[k * d for k in [-4, -3, -2, -1, 1, 2, 3, 4]]
+                          for d in self.line_directions], dtype=np.intp)
+        lines = np.arange(self.maxpoint, dtype=np.intp)[:, None, None] + steps[None, :, :]
+        lines[(lines < 0) | (lines >= self.maxpoint)] = 0
+        self.line_windows: np.ndarray = lines
+
+    def _calculate_symmetries(self) -> None:
+        """
+        The eight rotations and reflections of the board as point permutations.
+        symmetries[s][p] is the image of point p under symmetry s, for every
+        array index; BORDER points map to themselves. Symmetry 0 is the
+        identity. inverse_symmetries[s] undoes symmetries[s].
+        """
+        n = self.size + 1
+        transforms = [
+            lambda r, c: (r, c),
+            lambda r, c: (c, n - r),
+            lambda r, c: (n - r, n - c),
+            lambda r, c: (n - c, r),
+            lambda r, c: (r, n - c),
+            lambda r, c: (n - r, c),
+            lambda r, c: (c, r),
+            lambda r, c: (n - c, n - r),
+        ]
+        self.symmetries: np.ndarray = np.tile(np.arange(self.maxpoint, dtype=np.intp), (8, 1))
+        for s, transform in enumerate(transforms):
+            for point in self.points:
+                row, col = transform(*divmod(point, self.NS))
+                self.symmetries[s, point] = row * self.NS + col
+        self.inverse_symmetries: np.ndarray = np.argsort(self.symmetries, axis=1)
+
+
+_geometries: Dict[int, BoardGeometry] = {}
+
+
+def get_geometry(size: int) -> BoardGeometry:
+    """ The shared geometry for boards of this size """
+    if size not in _geometries:
+        _geometries[size] = BoardGeometry(size)
+    return _geometries[size]
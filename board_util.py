@@ -46,6 +46,9 @@ class GoBoardUtil(object):
         color : BLACK, WHITE
             the color to generate the move for.
         """
+        if not use_eye_filter:
+            # every empty point is legal, so sample one directly
+            return board.random_empty_point()
         moves: np.ndarray[GO_POINT] = board.get_empty_points()
         np.random.shuffle(moves)
         for move in moves:
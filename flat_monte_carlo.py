@@ -2,8 +2,15 @@ from board import GoBoard
 from board_util import GoBoardUtil
 from typing import List, Tuple
 from engine import GoEngine
+import math
 import random
+import time
+import numpy as np
 from policy_player import PolicyPlayer
+from pattern_policy import PatternPolicy
+from board_geometry import get_geometry
+from telemetry import TELEMETRY
+from time_control import STOP_SEARCH, search_stopped
 from board_base import (
     BLACK,
     WHITE,
@@ -12,6 +19,7 @@ from board_base import (
     GO_COLOR, GO_POINT,
     PASS,
     MAXSIZE,
+    bits_to_points,
     coord_to_point,
     opponent
 )
@@ -19,83 +27,531 @@ from board_base import (
 class SimulationPlayer(object):
     def __init__(self):
         self.numSimulations = 10
+        # run random rollouts for all candidate moves at once with BatchSimulator
+        self.useBatch = True
+        # how rollouts are spread over the candidate moves:
+        # 'uniform', 'ucb1' or 'halving' (sequential halving)
+        self.allocation = 'uniform'
+        self.explorationConstant = 0.5
+        # confidence parameter for dropping moves early in sequential halving
+        self.eliminationDelta = 0.05
+        # (move, visits, win rate) for each candidate of the last genmove
+        self.moveStats = []
+        # simulate only one of the candidates that are the same by a symmetry
+        # of the position, see unique_moves
+        self.useSymmetry = True
+        # end rule_based rollouts as soon as the result is forced, see adjudicate
+        self.useAdjudication = True
+        # look for dead draws only when at most this fraction of the board is empty
+        self.deadDrawEmptyFraction = 0.5
 
-    def genmove(self, board: GoBoard, player, policy):
+    def genmove(self, board: GoBoard, player, policy, deadline=None):
         '''
             1. Generate a list of all legal moves
             2. Simulate 10 games for each legal move
             3. Pick highest winrate
             4. Player resigns or passes when the game is over
             5. Returns the best move
+            With a deadline (as in time.time()), step 2 instead keeps
+            adding rollouts until the deadline, see search_until
         '''
         # Get all legal moves and put it into a list 
-        if policy == 'random':
-            legal_moves = board.get_empty_points()
-        else:
-            _, policy_moves =  PolicyPlayer().get_policy_moves(board, player, policy)
-            legal_moves = [coord_to_point(move_to_coord(move, board.size)[0], move_to_coord(move, board.size)[1], board.size) for move in policy_moves]
+        legal_moves = self.get_candidate_moves(board, player, policy)
+        if self.useSymmetry:
+            legal_moves = self.unique_moves(board, legal_moves)
         if len(legal_moves) == 0:
             print('No legal moves left. Yield')
             return 'Yield'
+        if len(legal_moves) == 1:
+            self.record_stats(legal_moves, [0.0], [0])
+            return legal_moves[0]
+        if self.allocation == 'ucb1':
+            wins, visits = self.search_ucb1(board, legal_moves, player, policy, deadline)
+            return self.most_visited_move(legal_moves, wins, visits)
+        if self.allocation == 'halving':
+            wins, visits, survivors = self.search_halving(board, legal_moves, player, policy, deadline)
+            return self.best_move([legal_moves[i] for i in survivors],
+                                  [wins[i] for i in survivors], [visits[i] for i in survivors])
+        if deadline is not None:
+            return self.search_until(board, legal_moves, player, policy, deadline)
         
         # Simulate each legal move and assign a value
+        if policy == 'random' and self.useBatch:
+            wins, visits = self.simulate_batch(board, legal_moves, player)
+            self.record_stats(legal_moves, wins, visits)
+            return self.best_move(legal_moves, wins, visits)
         score = [0] * len(legal_moves)
         for i in range(len(legal_moves)):
+            if i > 0 and STOP_SEARCH.is_set():
+                # stopped: choose among the moves simulated so far
+                legal_moves, score = legal_moves[:i], score[:i]
+                break
             move = legal_moves[i]
             #print(format_point(point_to_coord(move, board.size)))
             score[i] = self.simulate(board, move, player, policy)
             #print(score[i])
+        self.record_stats(legal_moves, [x * self.numSimulations for x in score],
+                          [self.numSimulations] * len(legal_moves))
         
         # Get the best score
         bestIndex = score.index(max(score))
         best = legal_moves[bestIndex]
         return best
 
-    def simulate(self, board: GoBoard, move, player, policy):
+    def get_candidate_moves(self, board: GoBoard, player, policy):
+        '''
+            Returns the moves genmove chooses from: all empty points for
+            the random policy, the policy moves otherwise
+        '''
+        if policy == 'random':
+            return board.get_empty_points()
+        _, policy_moves = PolicyPlayer().get_policy_points(board, player, policy)
+        return policy_moves
+
+    def unique_moves(self, board: GoBoard, moves):
+        '''
+            Returns one move of each set of moves that the symmetries of the
+            position map onto each other, the first one in the order of moves.
+            On an empty board this leaves about one move in eight.
+        '''
+        symmetries = board.symmetries()
+        if len(symmetries) == 1:
+            return moves
+        images = board.geometry.symmetries[symmetries[1:]]
+        seen = set()
+        unique = []
+        for move in moves:
+            if move in seen:
+                continue
+            unique.append(move)
+            seen.update(images[:, move].tolist())
+        return unique
+
+    def search_until(self, board: GoBoard, moves, player, policy, deadline):
         '''
-            Runs the number of simulations specified in numSimulations
+            Anytime version of genmove: runs rounds of rollouts over all
+            moves until deadline and returns the move with the best win rate.
+            Random rollouts run as batches which double in size while there
+            is time for them. Policy rollouts run one per move per round,
+            and the deadline is checked before every rollout.
+        '''
+        wins = [0.0] * len(moves)
+        visits = [0] * len(moves)
+        use_batch = policy == 'random' and self.useBatch
+        round_size = 1
+        while not search_stopped(deadline):
+            if use_batch:
+                start = time.time()
+                batch_wins, batch_visits = self.simulate_batch(board, moves, player, round_size)
+                for i in range(len(moves)):
+                    wins[i] += batch_wins[i]
+                    visits[i] += batch_visits[i]
+                elapsed = time.time() - start
+                if time.time() + 2 * elapsed < deadline:
+                    round_size *= 2
+                elif time.time() + elapsed >= deadline:
+                    break
+                continue
+            for i in range(len(moves)):
+                if search_stopped(deadline):
+                    break
+                wins[i] += self.simulate(board, moves[i], player, policy, 1)
+                visits[i] += 1
+        self.record_stats(moves, wins, visits)
+        return self.best_move(moves, wins, visits)
+
+    def search_ucb1(self, board: GoBoard, moves, player, policy, deadline=None):
+        '''
+            UCB1 allocation: after one rollout for each move, every rollout
+            goes to the move with the highest upper confidence bound
+            wins/visits + explorationConstant * sqrt(ln(total) / visits).
+            Stops after numSimulations rollouts per move on average,
+            or at the deadline if one is given.
+            Returns wins and visits for each move
+        '''
+        budget = None if deadline is not None else self.numSimulations * len(moves)
+        wins, visits = self.run_round(board, moves, list(range(len(moves))), 1,
+                                      player, policy, deadline)
+        total = sum(visits)
+        while total > 0 and (budget is None or total < budget) \
+                and not search_stopped(deadline):
+            log_total = math.log(total)
+            best = -1
+            bestBound = -1.0
+            for i in range(len(moves)):
+                if visits[i] == 0:
+                    best = i
+                    break
+                bound = wins[i] / visits[i] + self.explorationConstant * math.sqrt(log_total / visits[i])
+                if bound > bestBound:
+                    best = i
+                    bestBound = bound
+            wins[best] += self.simulate(board, moves[best], player, policy, 1)
+            visits[best] += 1
+            total += 1
+        self.record_stats(moves, wins, visits)
+        return wins, visits
+
+    def search_halving(self, board: GoBoard, moves, player, policy, deadline=None):
+        '''
+            Sequential halving: the budget of numSimulations rollouts per
+            move is split evenly over ceil(log2(len(moves))) rounds. In each
+            round all remaining moves get the same number of rollouts, then
+            the worse half is dropped, together with every move whose upper
+            confidence bound is below the best lower bound (Hoeffding bound
+            with eliminationDelta).
+            With a deadline, halving starts over on all moves with a doubled
+            budget while there is time left, keeping the statistics.
+            Returns wins and visits for each move, and the indices of the
+            moves still left at the end
+        '''
+        wins = [0.0] * len(moves)
+        visits = [0] * len(moves)
+        budget = self.numSimulations * len(moves)
+        while True:
+            survivors = list(range(len(moves)))
+            num_rounds = max(1, math.ceil(math.log2(len(moves))))
+            while len(survivors) > 1:
+                per_move = max(1, budget // (len(survivors) * num_rounds))
+                round_wins, round_visits = self.run_round(board, moves, survivors, per_move,
+                                                          player, policy, deadline)
+                for i in survivors:
+                    wins[i] += round_wins[i]
+                    visits[i] += round_visits[i]
+                if search_stopped(deadline):
+                    break
+                survivors = self.eliminate(survivors, wins, visits)
+            if deadline is None or search_stopped(deadline):
+                break
+            budget *= 2
+        survivors = [i for i in survivors if visits[i] > 0] or survivors
+        self.record_stats(moves, wins, visits)
+        return wins, visits, survivors
+
+    def eliminate(self, survivors, wins, visits):
+        '''
+            Keep the better half of survivors by win rate, minus the moves
+            that are worse than the best one with confidence 1 - eliminationDelta
+        '''
+        rate = lambda i: wins[i] / visits[i] if visits[i] > 0 else 0.0
+        margin = lambda i: math.sqrt(math.log(2 / self.eliminationDelta) / (2 * max(visits[i], 1)))
+        best_lower = max(rate(i) - margin(i) for i in survivors)
+        ranked = sorted(survivors, key=rate, reverse=True)
+        kept = ranked[:max(1, len(ranked) // 2)]
+        kept = [i for i in kept if rate(i) + margin(i) >= best_lower] or ranked[:1]
+        # keep the original move order, so ties are broken as in genmove
+        return sorted(kept)
+
+    def run_round(self, board: GoBoard, moves, indices, num_simulations, player, policy,
+                  deadline=None):
+        '''
+            Runs num_simulations rollouts for each move in moves[indices],
+            as one batch for random rollouts. Policy rollouts stop early
+            at the deadline.
+            Returns wins and visits for all moves
+        '''
+        wins = [0.0] * len(moves)
+        visits = [0] * len(moves)
+        if policy == 'random' and self.useBatch:
+            batch_wins, batch_visits = self.simulate_batch(
+                board, [moves[i] for i in indices], player, num_simulations)
+            for i, w, v in zip(indices, batch_wins, batch_visits):
+                wins[i] = w
+                visits[i] = v
+            return wins, visits
+        for i in indices:
+            for _ in range(num_simulations):
+                if search_stopped(deadline):
+                    return wins, visits
+                wins[i] += self.simulate(board, moves[i], player, policy, 1)
+                visits[i] += 1
+        return wins, visits
+
+    def most_visited_move(self, moves, wins, visits):
+        '''
+            Returns the move with the most rollouts, ties broken by win rate
+        '''
+        bestIndex = max(range(len(moves)),
+                        key=lambda i: (visits[i], wins[i] / visits[i] if visits[i] else 0.0, -i))
+        return moves[bestIndex]
+
+    def record_stats(self, moves, wins, visits):
+        self.moveStats = [(moves[i], visits[i], wins[i] / visits[i] if visits[i] else 0.0)
+                          for i in range(len(moves))]
+
+    def best_move(self, moves, wins, visits):
+        '''
+            Returns the move with the highest win rate among the moves with
+            at least one rollout, the first move if there are none
+        '''
+        bestIndex = 0
+        bestRate = -1.0
+        for i in range(len(moves)):
+            if visits[i] > 0 and wins[i] / visits[i] > bestRate:
+                bestIndex = i
+                bestRate = wins[i] / visits[i]
+        return moves[bestIndex]
+
+    def simulate(self, board: GoBoard, move, player, policy, num_simulations=None):
+        '''
+            Runs the number of simulations specified in numSimulations,
+            or num_simulations if given
             Returns the evaluation of the results
             Utilizes helper function simulate1 for each simulation
+            The rollouts are played on board itself and taken back
+            with undo_move, so board is unchanged on return
         '''
+        if num_simulations is None:
+            num_simulations = self.numSimulations
         stats = [0] * 3
         
-        board_copy1 = board.copy()
-        board_copy1.play_move(move, player)
-        for _ in range(self.numSimulations):
-            board_copy2 = board_copy1.copy()
-            winner = self.simulate1(board_copy2, policy)
+        board.play_move(move, player)
+        depth = len(board.undo_stack)
+        for _ in range(num_simulations):
+            winner = self.simulate1(board, policy)
             stats[winner] += 1
-            #board = board_copy2
+            while len(board.undo_stack) > depth:
+                board.undo_move()
+        board.undo_move()
 
-        #board = board_copy1
-        assert sum(stats) == self.numSimulations
+        assert sum(stats) == num_simulations
         #print(stats)
-        eval = (stats[player] + 0.5 * stats[EMPTY]) / self.numSimulations
+        eval = (stats[player] + 0.5 * stats[EMPTY]) / num_simulations
         #print(eval)
         return eval
     
+    def simulate_batch(self, board: GoBoard, moves, player, num_simulations=None):
+        '''
+            Runs numSimulations (or num_simulations) random rollouts for
+            every move in moves with one call to BatchSimulator
+            Returns wins (draws counting half) and visits for each move.
+            After a stop request only the finished rollouts are counted
+        '''
+        n = self.numSimulations if num_simulations is None else num_simulations
+        starts = []
+        captures = []
+        stats = np.zeros((len(moves), 3))
+        pending = []
+        for i, move in enumerate(moves):
+            board.play_move(move, player)
+            if board.isGameOver():
+                stats[i, board.evalEndState()] = n
+            else:
+                pending.append(i)
+                starts.append(board.board.copy())
+                captures.append([0, board.black_captures, board.white_captures])
+            board.undo_move()
+        if pending:
+            start = time.perf_counter()
+            simulator = BatchSimulator(board.size)
+            winners, finished = simulator.simulate(
+                np.repeat(np.array(starts), n, axis=0),
+                np.repeat(np.array(captures), n, axis=0),
+                opponent(player))
+            if TELEMETRY.enabled:
+                TELEMETRY.times['batch'] += time.perf_counter() - start
+                TELEMETRY.policy_classes['Random'] += simulator.plies
+                TELEMETRY.end_rollouts(int(np.count_nonzero(finished)), simulator.plies)
+            winners = winners.reshape(len(pending), n)
+            finished = finished.reshape(len(pending), n)
+            for color in [EMPTY, BLACK, WHITE]:
+                stats[pending, color] = np.count_nonzero((winners == color) & finished, axis=1)
+        wins = stats[:, player] + 0.5 * stats[:, EMPTY]
+        return wins.tolist(), stats.sum(axis=1).astype(int).tolist()
+
     def simulate1(self, board: GoBoard, policy):
         '''
             Completes 1 simulation until end state using random rules
+            The moves stay on board, the caller takes them back with undo_move
+            With useAdjudication, rule_based rollouts stop as soon as the
+            result is forced, and return that result, see adjudicate.
+            Random rollouts, like batch rollouts, are played out: a random
+            player need not play a win point, so it forces nothing, and
+            dead draws are too rare in random play to pay for the test
         '''
+        if TELEMETRY.enabled:
+            return self.simulate1_measured(board, policy)
         if policy == 'random':
             while not board.isGameOver():
-                move = random.choice(board.get_empty_points())
+                move = board.random_empty_point()
                 #print(move)
                 board.play_move(move, board.current_player)
+        elif policy == 'pattern':
+            pattern_policy = PatternPolicy()
+            while not board.isGameOver():
+                move = pattern_policy.sample(board, board.current_player)
+                board.play_move(move, board.current_player)
         else:
-            
+            policy_player = PolicyPlayer()
             while not board.isGameOver():
-                _, policy_moves =  PolicyPlayer().get_policy_moves(board, board.current_player, policy)
-                #print(policy_moves)
-                moves = [coord_to_point(move_to_coord(move, board.size)[0], move_to_coord(move, board.size)[1], board.size) for move in policy_moves]
-                move = random.choice(moves)
+                moveType, policy_moves = policy_player.get_policy_bits(board, board.current_player, policy)
+                if self.useAdjudication:
+                    winner = self.adjudicate(board, moveType)
+                    if winner is not None:
+                        return winner
+                if moveType == 'Random':
+                    move = board.random_empty_point()
+                else:
+                    move = random.choice(bits_to_points(policy_moves))
                 #print(move)
                 board.play_move(move, board.current_player)
         #print(board.current_player)
         #print(GoBoardUtil.get_twoD_board(board))
         return board.evalEndState()
+
+    def adjudicate(self, board: GoBoard, moveType):
+        '''
+            Returns the forced result of a policy rollout, given the class of
+            the policy moves of the side to move, or None if there is none:
+            the side to move wins with a Win move; the opponent wins if it
+            can complete five at two points and the side to move can not
+            capture, so only one of them can be blocked; and the Random class
+            late in the game may be a dead draw (see GoBoard.is_dead_draw).
+            Only threats the policy has already computed are looked up,
+            apart from the dead draw test.
+        '''
+        color = board.current_player
+        if moveType == 'Win':
+            return color
+        if moveType == 'BlockWin':
+            threats = board.win_points_bits(opponent(color))
+            if threats & (threats - 1) and not board.capture_points_bits(color):
+                return opponent(color)
+        elif moveType == 'Random' \
+                and len(board.empty_points) <= self.deadDrawEmptyFraction * board.size * board.size \
+                and board.is_dead_draw():
+            return EMPTY
+        return None
+
+    def simulate1_measured(self, board: GoBoard, policy):
+        '''
+            simulate1 with telemetry: the same moves from the same random
+            numbers, but each phase of every ply is timed, and the policy
+            class of each move is counted
+        '''
+        clock = time.perf_counter
+        times = TELEMETRY.times
+        policy_classes = TELEMETRY.policy_classes
+        pattern_policy = PatternPolicy() if policy == 'pattern' else None
+        policy_player = PolicyPlayer()
+        plies = 0
+        winner = None
+        while True:
+            start = clock()
+            over = board.isGameOver()
+            chosen = clock()
+            times['end'] += chosen - start
+            if over:
+                break
+            if policy == 'random':
+                moveType = 'Random'
+                move = board.random_empty_point()
+            elif pattern_policy is not None:
+                moveType = 'Pattern'
+                move = pattern_policy.sample(board, board.current_player)
+            else:
+                moveType, policy_moves = policy_player.get_policy_bits(board, board.current_player, policy)
+                if self.useAdjudication:
+                    winner = self.adjudicate(board, moveType)
+                    if winner is not None:
+                        times['policy'] += clock() - chosen
+                        break
+                if moveType == 'Random':
+                    move = board.random_empty_point()
+                else:
+                    move = random.choice(bits_to_points(policy_moves))
+            played = clock()
+            times['policy'] += played - chosen
+            policy_classes[moveType] += 1
+            board.play_move(move, board.current_player)
+            times['play'] += clock() - played
+            plies += 1
+        TELEMETRY.end_rollouts(1, plies)
+        if winner is not None:
+            TELEMETRY.adjudicated += 1
+            return winner
+        return board.evalEndState()
     
+class BatchSimulator(object):
+    '''
+        Plays many random rollouts at once with NumPy.
+        The games are the rows of a (games x maxpoint) array in the padded
+        layout of GoBoard. All games have the same color to play and advance
+        one ply per step, so that color is the same in every game.
+    '''
+    def __init__(self, size: int):
+        geometry = get_geometry(size)
+        self.maxpoint = geometry.maxpoint
+        # per point: the five-windows through it and the capture patterns from it
+        self.move_windows = geometry.five_windows[geometry.point_windows]
+        self.capture_windows = geometry.capture_windows
+        self.plies = 0
+
+    def simulate(self, boards: np.ndarray, captures: np.ndarray, color: GO_COLOR) -> np.ndarray:
+        '''
+            boards: start positions, one game per row, none of them finished
+            captures: (games x 3) capture counts indexed by color
+            color: the color to play first in every game
+            Returns the winner of each game, EMPTY for a draw, and whether
+            each game finished: after a stop request the games still
+            running are left unfinished, and are not results
+        '''
+        boards = boards.astype(np.int8)
+        captures = captures.copy()
+        num_games = boards.shape[0]
+        winners = np.full(num_games, EMPTY, dtype=np.int8)
+        active = np.arange(num_games)
+        # moves played over all games, for telemetry
+        self.plies = 0
+        while active.size > 0:
+            if STOP_SEARCH.is_set():
+                finished = np.ones(num_games, dtype=bool)
+                finished[active] = False
+                return winners, finished
+            current = boards[active]
+            # a full board is a draw, checked before each move as in isGameOver
+            has_empty = (current == EMPTY).any(axis=1)
+            active = active[has_empty]
+            current = current[has_empty]
+            if active.size == 0:
+                break
+            keys = np.random.random(current.shape)
+            keys[current != EMPTY] = -1.0
+            moves = np.argmax(keys, axis=1)
+            boards[active, moves] = color
+            self.plies += active.size
+            self._capture(boards, captures, active, moves, color)
+            won = self._five_through(boards, active, moves, color) | (captures[active, color] >= 10)
+            winners[active[won]] = color
+            active = active[~won]
+            color = opponent(color)
+        return winners, np.ones(num_games, dtype=bool)
+
+    def _capture(self, boards, captures, active, moves, color):
+        '''
+            Removes the X-O-O-X captured pairs of each game's move.
+            The patterns in the eight directions share no point but the
+            move, so they are all looked up with one index operation.
+        '''
+        O = opponent(color)
+        patterns = self.capture_windows[moves]
+        stones = boards.ravel().take(active[:, None, None] * self.maxpoint + patterns)
+        hit = (stones[:, :, 0] == O) & (stones[:, :, 1] == O) & (stones[:, :, 2] == color)
+        if hit.any():
+            games, directions = np.nonzero(hit)
+            rows = active[games]
+            boards[rows, patterns[games, directions, 0]] = EMPTY
+            boards[rows, patterns[games, directions, 1]] = EMPTY
+            np.add.at(captures, (rows, color), 2)
+
+    def _five_through(self, boards, active, moves, color):
+        '''
+            Returns for each game whether its move made five in a row
+        '''
+        windows = active[:, None, None] * self.maxpoint + self.move_windows[moves]
+        stones = boards.ravel().take(windows)
+        return (stones == color).all(axis=2).any(axis=1)
+
 #==============================================================================================
 # Copied here for easy use
 #==============================================================================================
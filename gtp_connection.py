@@ -8,13 +8,21 @@ Parts of this code were originally based on the gtp module
 in the Deep-Go project by Isaac Henrion and Amos Storkey 
 at the University of Edinburgh.
 """
+import queue
+import threading
 import traceback
 import numpy as np
 import re
+import time
 from sys import stdin, stdout, stderr
 from typing import Any, Callable, Dict, List, Tuple
 from policy_player import PolicyPlayer
 from flat_monte_carlo import SimulationPlayer
+from mcts import MCTSPlayer
+from parallel_simulation import SimulationPool
+from time_control import TimeControl, STOP_SEARCH
+from position_cache import PositionCache
+from telemetry import TELEMETRY
 
 from board_base import (
     BLACK,
@@ -46,6 +54,18 @@ class GtpConnection:
         self._debug_mode: bool = debug_mode
         self.go_engine = go_engine
         self.policy = 'random'
+        self.simulation_player: SimulationPlayer = SimulationPlayer()
+        self.mcts_player: MCTSPlayer = MCTSPlayer()
+        # 'flat' for SimulationPlayer, 'mcts' for MCTSPlayer
+        self.player_type = 'flat'
+        # search on the opponent's time, see next_cmd
+        self.ponder = False
+        # genmove runs on a SimulationPool if num_workers > 1
+        self.num_workers: int = 1
+        self.simulation_pool: SimulationPool = None
+        # results shared with other games and processes, see position_cache_cmd
+        self.position_cache: PositionCache = None
+        self.time_control: TimeControl = TimeControl()
         self.board: GoBoard = board
         self.commands: Dict[str, Callable[[List[str]], None]] = {
             "protocol_version": self.protocol_version_cmd,
@@ -70,9 +90,19 @@ class GtpConnection:
             "gogui-rules_board": self.gogui_rules_board_cmd,
             "gogui-analyze_commands": self.gogui_analyze_cmd,
             "timelimit": self.timelimit_cmd,
+            "time_settings": self.time_settings_cmd,
+            "time_left": self.time_left_cmd,
             "solve": self.solve_cmd,
             "policy": self.set_policy_cmd,
-            "policy_moves": self.policy_moves_cmd
+            "policy_moves": self.policy_moves_cmd,
+            "workers": self.workers_cmd,
+            "allocation": self.allocation_cmd,
+            "player": self.player_cmd,
+            "move_stats": self.move_stats_cmd,
+            "telemetry": self.telemetry_cmd,
+            "stop": self.stop_cmd,
+            "ponder": self.ponder_cmd,
+            "position_cache": self.position_cache_cmd
         }
 
         # argmap is used for argument checking
@@ -85,6 +115,15 @@ class GtpConnection:
             "genmove": (1, "Usage: genmove {w,b}"),
             "play": (2, "Usage: play {b,w} MOVE"),
             "legal_moves": (1, "Usage: legal_moves {w,b}"),
+            "workers": (1, "Usage: workers INT"),
+            "allocation": (1, "Usage: allocation {uniform,ucb1,halving}"),
+            "player": (1, "Usage: player {flat,mcts}"),
+            "telemetry": (1, "Usage: telemetry {on,off,reset,show}"),
+            "ponder": (1, "Usage: ponder {on,off}"),
+            "position_cache": (1, "Usage: position_cache {DIRECTORY,off}"),
+            "timelimit": (1, "Usage: timelimit INT"),
+            "time_settings": (3, "Usage: time_settings MAIN_TIME BYO_YOMI_TIME BYO_YOMI_STONES"),
+            "time_left": (3, "Usage: time_left {w,b} TIME STONES"),
         }
 
     def write(self, data: str) -> None:
@@ -95,27 +134,69 @@ class GtpConnection:
 
     def start_connection(self) -> None:
         """
-        Start a GTP connection. 
-        This function continuously monitors standard input for commands.
+        Start a GTP connection.
+        A reader thread monitors standard input and queues the commands,
+        which this thread executes in order, so responses keep the order
+        of the commands. stop and quit also take effect as soon as they
+        are read: the command running then returns its best answer so
+        far, while the commands queued before them run as usual.
         """
-        line = stdin.readline()
+        commands: queue.Queue = queue.Queue()
+        reader = threading.Thread(target=self.read_commands, args=(commands,), daemon=True)
+        reader.start()
+        line = self.next_cmd(commands)
         while line:
+            STOP_SEARCH.begin()
             self.get_cmd(line)
-            line = stdin.readline()
+            line = self.next_cmd(commands)
 
-    def get_cmd(self, command: str) -> None:
+    def next_cmd(self, commands: queue.Queue) -> str:
         """
-        Parse command string and execute it
+        Wait for the next command line. With pondering on and the MCTS
+        player, the tree of the current position grows in the meantime;
+        a new command ends the pondering after the current iteration.
+        """
+        if self.ponder and self.player_type == 'mcts' and commands.empty():
+            self.mcts_player.ponder(self.board, self.policy, lambda: not commands.empty())
+        return commands.get()
+
+    def read_commands(self, commands: queue.Queue) -> None:
+        """
+        Reader thread: queue every line of standard input,
+        then an empty line at the end of the input
+        """
+        # read through a file object of our own: worker processes started
+        # while this thread waits for input close sys.stdin, which would
+        # wait forever for the lock this thread holds
+        with open(stdin.fileno(), closefd=False) as input_stream:
+            line = input_stream.readline()
+            while line:
+                elements = self.parse_cmd(line)
+                if elements and elements[0] in ["stop", "quit"]:
+                    STOP_SEARCH.request()
+                commands.put(line)
+                line = input_stream.readline()
+        commands.put("")
+
+    def parse_cmd(self, command: str) -> List[str]:
+        """
+        Split command string into the command name and its arguments,
+        an empty list for blank lines and comments
         """
         if len(command.strip(" \r\t")) == 0:
-            return
+            return []
         if command[0] == "#":
-            return
+            return []
         # Strip leading numbers from regression tests
         if command[0].isdigit():
             command = re.sub("^\d+", "", command).lstrip()
+        return command.split()
 
-        elements: List[str] = command.split()
+    def get_cmd(self, command: str) -> None:
+        """
+        Parse command string and execute it
+        """
+        elements: List[str] = self.parse_cmd(command)
         if not elements:
             return
         command_name: str = elements[0]
@@ -165,6 +246,7 @@ class GtpConnection:
         Reset the board to empty board of given size
         """
         self.board.reset(size)
+        self.mcts_player.reset()
 
     def board2d(self) -> str:
         return str(GoBoardUtil.get_twoD_board(self.board))
@@ -176,8 +258,17 @@ class GtpConnection:
     def quit_cmd(self, args: List[str]) -> None:
         """ Quit game and exit the GTP interface """
         self.respond()
+        self.close_simulation_pool()
         exit()
 
+    def stop_cmd(self, args: List[str]) -> None:
+        """
+        Interrupt the search: genmove and solve return their best answer
+        so far. The reader thread has already stopped the command that was
+        running when it read this one; nothing is left to do here.
+        """
+        self.respond()
+
     def name_cmd(self, args: List[str]) -> None:
         """ Return the name of the Go engine """
         self.respond(self.go_engine.name)
@@ -253,6 +344,7 @@ class GtpConnection:
                      "pstring/Board Size/gogui-rules_board_size\n"
                      "pstring/Rules GameID/gogui-rules_game_id\n"
                      "pstring/Show Board/gogui-rules_board\n"
+                     "string/Telemetry/telemetry show\n"
                      )
 
     def gogui_rules_game_id_cmd(self, args: List[str]) -> None:
@@ -291,7 +383,7 @@ class GtpConnection:
 
     def gogui_rules_final_result_cmd(self, args: List[str]) -> None:
         """ We already implemented this function for Assignment 2 """
-        result1 = self.board.detect_five_in_a_row()
+        result1 = self.board.five_winner
         result2 = EMPTY
         if self.board.get_captures(BLACK) >= 10:
             result2 = BLACK
@@ -302,7 +394,7 @@ class GtpConnection:
             self.respond("black")
         elif (result1 == WHITE) or (result2 == WHITE):
             self.respond("white")
-        elif self.board.get_empty_points().size == 0:
+        elif self.board.boardIsFull():
             self.respond("draw")
         else:
             self.respond("unknown")
@@ -310,7 +402,7 @@ class GtpConnection:
 
     def gogui_rules_legal_moves_cmd(self, args: List[str]) -> None:
         """ We already implemented this function for Assignment 2 """
-        if (self.board.detect_five_in_a_row() != EMPTY) or \
+        if (self.board.five_winner != EMPTY) or \
             (self.board.get_captures(BLACK) >= 10) or \
             (self.board.get_captures(WHITE) >= 10):
             self.respond("")
@@ -341,6 +433,7 @@ class GtpConnection:
                 return
             else:
                 # self.board.try_captures(coord, color)
+                self.mcts_player.update_with_move(self.board, move, color, self.policy)
                 self.debug_msg(
                     "Move: {}\nBoard:\n{}\n".format(board_move, self.board2d())
                 )
@@ -363,12 +456,51 @@ class GtpConnection:
     """
     
     def timelimit_cmd(self, args: List[str]) -> None:
-        """ Implement this function for Assignment 2 """
-        pass
+        """ Set the maximum time in seconds for one genmove """
+        timelimit = float(args[0])
+        if timelimit <= 0:
+            self.error("timelimit must be positive")
+            return
+        self.time_control.timelimit = timelimit
+        self.respond()
+
+    def time_settings_cmd(self, args: List[str]) -> None:
+        """ Set the game clock: main time, byo-yomi time and byo-yomi stones """
+        self.time_control.set_time_settings(float(args[0]), float(args[1]), int(args[2]))
+        self.respond()
+
+    def time_left_cmd(self, args: List[str]) -> None:
+        """ Update the clock of color args[0]: seconds and stones left """
+        color = color_to_int(args[0].lower()[0])
+        self.time_control.set_time_left(color, float(args[1]), int(args[2]))
+        self.respond()
 
     def solve_cmd(self, args: List[str]) -> None:
-        """ Implement this function for Assignment 2 """
-        pass
+        """
+        Solve the current position within the timelimit (1 second if unset).
+        Responds "<winner> <move>" if the side to move wins or can draw,
+        "<winner>" if the opponent wins, and "unknown" if not solved in time.
+        """
+        timelimit = self.time_control.timelimit
+        if timelimit is None:
+            timelimit = 1.0
+        solved = None
+        if self.position_cache is not None:
+            solved = self.position_cache.solved(self.board)
+        if solved is not None:
+            winner, move = solved
+        else:
+            winner, move = self.go_engine.solve(self.board, timelimit)
+            if winner is not None and self.position_cache is not None:
+                self.position_cache.store_solved(self.board, winner, move)
+        if winner is None:
+            self.respond("unknown")
+            return
+        result = {BLACK: "b", WHITE: "w", EMPTY: "draw"}[winner]
+        if move is not None:
+            move_coord = point_to_coord(move, self.board.size)
+            result += " " + format_point(move_coord).lower()
+        self.respond(result)
     
     """
     ==========================================================================
@@ -377,10 +509,121 @@ class GtpConnection:
     """
 
     def set_policy_cmd(self, args: List[str]) -> None:
-        """ Set the policy to be used by the engine """
+        """
+        Set the policy to be used by the engine:
+        random, rule_based, pattern or pattern_exact (see pattern_policy.py)
+        """
         self.policy = args[0]
         self.respond()
 
+    def workers_cmd(self, args: List[str]) -> None:
+        """ Set the number of worker processes used by genmove """
+        num_workers = int(args[0])
+        if num_workers < 1:
+            self.error("number of workers must be at least 1")
+            return
+        if num_workers != self.num_workers:
+            self.close_simulation_pool()
+        self.num_workers = num_workers
+        self.respond()
+
+    def allocation_cmd(self, args: List[str]) -> None:
+        """ Set how genmove spreads rollouts over the candidate moves """
+        if args[0] not in ['uniform', 'ucb1', 'halving']:
+            self.error("unknown allocation: {}".format(args[0]))
+            return
+        self.simulation_player.allocation = args[0]
+        self.respond()
+
+    def player_cmd(self, args: List[str]) -> None:
+        """ Choose the player used by genmove: flat Monte Carlo or MCTS """
+        if args[0] not in ['flat', 'mcts']:
+            self.error("unknown player: {}".format(args[0]))
+            return
+        self.player_type = args[0]
+        self.respond()
+
+    def move_stats_cmd(self, args: List[str]) -> None:
+        """
+        Rollouts and win rate of each candidate of the last genmove,
+        most visited first
+        """
+        if self.player_type == 'mcts':
+            stats = self.mcts_player.moveStats
+        elif self.num_workers > 1 and self.simulation_pool is not None:
+            stats = self.simulation_pool.moveStats
+        else:
+            stats = self.simulation_player.moveStats
+        stats = sorted(stats, key=lambda s: -s[1])
+        self.respond(" ".join("{} {} {:.3f}".format(
+            format_point(point_to_coord(move, self.board.size)).lower(), visits, rate)
+            for move, visits, rate in stats))
+
+    def telemetry_cmd(self, args: List[str]) -> None:
+        """
+        Rollout counters and timers, see telemetry.py.
+        on and off switch them, reset clears them, show reports them.
+        Only rollouts run in this process are counted, not those of
+        the worker processes.
+        """
+        if args[0] == 'on':
+            TELEMETRY.enabled = True
+        elif args[0] == 'off':
+            TELEMETRY.enabled = False
+        elif args[0] == 'reset':
+            TELEMETRY.reset()
+        elif args[0] == 'show':
+            self.respond(TELEMETRY.summary())
+            return
+        else:
+            self.error("unknown telemetry command: {}".format(args[0]))
+            return
+        self.respond()
+
+    def ponder_cmd(self, args: List[str]) -> None:
+        """
+        Switch pondering: while waiting for commands, the MCTS player
+        keeps searching the current position. play keeps the subtree of
+        the move played, so the next genmove starts from it.
+        Only the MCTS player ponders, so ponder on needs player mcts.
+        """
+        if args[0] not in ['on', 'off']:
+            self.error("Usage: ponder {on,off}")
+            return
+        if args[0] == 'on' and self.player_type != 'mcts':
+            self.error("pondering needs player mcts")
+            return
+        self.ponder = args[0] == 'on'
+        self.respond()
+
+    def position_cache_cmd(self, args: List[str]) -> None:
+        """
+        Use the position cache in the given directory, or none with off.
+        solve and genmove look up the position first, and store what
+        they find, see position_cache.py.
+        """
+        if self.position_cache is not None:
+            self.position_cache.close()
+            self.position_cache = None
+        if args[0] != 'off':
+            try:
+                self.position_cache = PositionCache(args[0])
+            except (OSError, ValueError) as e:
+                self.error("cannot open position cache: {}".format(e))
+                return
+        self.respond()
+
+    def get_simulation_pool(self) -> SimulationPool:
+        """ Create the worker pool on first use, then keep reusing it """
+        if self.simulation_pool is None:
+            self.simulation_pool = SimulationPool(self.num_workers)
+        return self.simulation_pool
+
+    def close_simulation_pool(self) -> None:
+        if self.simulation_pool is not None:
+            self.simulation_pool.close()
+            self.simulation_pool = None
+
     def policy_moves_cmd(self, args: List[str]):
         policy, moves = PolicyPlayer().get_policy_moves(self.board, self.board.current_player, self.policy)
         self.respond(policy + ' ' + ' '.join(moves))
@@ -393,18 +636,45 @@ class GtpConnection:
         """
         board_color = args[0].lower()
         color = color_to_int(board_color)
-        result1 = self.board.detect_five_in_a_row()
+        result1 = self.board.five_winner
         result2 = EMPTY
         if self.board.get_captures(opponent(color)) >= 10:
             result2 = opponent(color)
         if result1 == opponent(color) or result2 == opponent(color):
             self.respond("resign")
             return
-        move = SimulationPlayer().genmove(self.board, color, self.policy)
+        start = time.time()
+        deadline = self.time_control.deadline(self.board, color, start)
+        move = None
+        if self.position_cache is not None:
+            candidates = self.simulation_player.get_candidate_moves(self.board, color, self.policy)
+            if self.simulation_player.useSymmetry:
+                candidates = self.simulation_player.unique_moves(self.board, candidates)
+            move = self.position_cache.book_move(self.board, color, [int(m) for m in candidates])
+        if move is not None:
+            pass
+        elif self.player_type == 'mcts':
+            move = self.mcts_player.genmove(self.board, color, self.policy, deadline)
+            self.store_search(color, move, self.mcts_player.moveStats)
+        elif self.num_workers > 1:
+            move = self.get_simulation_pool().genmove(self.board, color, self.policy,
+                                                      deadline=deadline)
+            self.store_search(color, move, self.simulation_pool.moveStats)
+        else:
+            move = self.simulation_player.genmove(self.board, color, self.policy, deadline)
+            self.store_search(color, move, self.simulation_player.moveStats)
+        self.time_control.record_move_time(color, time.time() - start)
+        if TELEMETRY.enabled:
+            TELEMETRY.write_live()
         move_coord = point_to_coord(move, self.board.size)
         move_as_string = format_point(move_coord).lower()
         #self.play_cmd([board_color, move_as_string, 'print_move'])
         self.respond(move_as_string)
+    def store_search(self, color: GO_COLOR, move: GO_POINT, move_stats: List) -> None:
+        """ Add the result of a genmove search to the position cache, if one is used """
+        if self.position_cache is not None and move not in ['Yield', PASS]:
+            self.position_cache.store_search(self.board, color, move_stats)
+
     """
     ==========================================================================
     Assignment 1 - game-specific commands end here
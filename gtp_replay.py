@@ -0,0 +1,209 @@
+"""
+gtp_replay.py
+Replays GTP scripts in process: checks the expected responses and
+measures the latency of every command.
+
+Run as
+
+    python3 -m gtp_replay FILE [FILE ...] [--jobs 4] [--seed 0]
+                          [--output results.json] [--baseline latency.json]
+                          [--threshold 0.25] [--save-baseline]
+
+A script is a file of GTP commands in the format of gogui-regress, such
+as assignment3-public-tests.gtp, or a trace of the commands sent to the
+engine in a real game. Its commands go straight to GtpConnection.get_cmd,
+without an engine process in between. A line
+
+    #? [PATTERN]
+
+tests the response of the command before it: it passes if the regular
+expression PATTERN matches the whole response, after the "= ". With
+[!PATTERN] it passes if PATTERN does not match. A * after the closing
+bracket marks a known failure, which does not fail the run. An error
+response is matched as "? " followed by the message, so it fails a test
+unless PATTERN expects it, as in #? [\? .*].
+
+Every file is replayed on a new engine, with the random generators seeded
+from seed, so a run is repeatable. The files are spread over jobs
+processes. The latency of each command is reported per command name as
+percentiles over all files.
+
+The exit status is 1 if a test failed unexpectedly, or if a latency
+percentile is slower than the one in the baseline file by more than
+threshold (a fraction, as in benchmark.py). Without --baseline latency
+is only reported.
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from benchmark import DEFAULT_THRESHOLD, compare, load_results, write_results
+from board import GoBoard
+from board_base import DEFAULT_SIZE
+from gtp_connection import GtpConnection
+from Ninuki import Go0
+
+PERCENTILES: List[int] = [50, 90, 99]
+EXPECTATION = re.compile(r"#\?\s*\[(.*)\](\*?)\s*$")
+
+# (line number, command, response, pattern, passed, known failure)
+TestResult = Tuple[int, str, str, str, bool, bool]
+
+
+class ReplayConnection(GtpConnection):
+    """
+    GtpConnection that keeps the response of the last command
+    instead of writing it to stdout
+    """
+    def __init__(self, go_engine: Go0, board: GoBoard) -> None:
+        GtpConnection.__init__(self, go_engine, board)
+        self.response: str = ""
+        self.failed: bool = False
+
+    def error(self, error_msg: str) -> None:
+        self.response = error_msg
+        self.failed = True
+
+    def respond(self, response: str = "") -> None:
+        self.response = response
+        self.failed = False
+
+
+def check(pattern: str, response: str) -> bool:
+    """ True if response passes the test #? [pattern] """
+    if pattern.startswith("!"):
+        return re.fullmatch(pattern[1:], response, re.DOTALL) is None
+    return re.fullmatch(pattern, response, re.DOTALL) is not None
+
+
+def replay_file(path: str, seed: int = 0) -> Tuple[List[TestResult], Dict[str, List[float]]]:
+    """
+    Replay the script in path on a new engine.
+    Returns the results of its tests, and the latencies in seconds of its
+    commands by command name.
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    con = ReplayConnection(Go0(), GoBoard(DEFAULT_SIZE))
+    tests: List[TestResult] = []
+    latencies: Dict[str, List[float]] = {}
+    command = ""
+    with open(path) as f:
+        lines = f.read().splitlines()
+    try:
+        for number, line in enumerate(lines, 1):
+            expectation = EXPECTATION.match(line)
+            if expectation:
+                pattern, known = expectation.group(1), expectation.group(2) == "*"
+                response = con.response.strip()
+                if con.failed:
+                    response = "? " + response
+                tests.append((number, command, response, pattern, check(pattern, response), known))
+                continue
+            elements = con.parse_cmd(line)
+            if not elements:
+                continue
+            command = line.strip()
+            con.response, con.failed = "", False
+            start = time.perf_counter()
+            try:
+                con.get_cmd(line)
+            except SystemExit:
+                break
+            except Exception as e:
+                con.error("exception: {}".format(e))
+            latencies.setdefault(elements[0], []).append(time.perf_counter() - start)
+    finally:
+        con.close_simulation_pool()
+        if con.position_cache is not None:
+            con.position_cache.close()
+    return tests, latencies
+
+
+def replay_files(paths: List[str], jobs: int = 1,
+                 seed: int = 0) -> List[Tuple[List[TestResult], Dict[str, List[float]]]]:
+    """ replay_file for every path, on up to jobs processes """
+    if jobs <= 1 or len(paths) <= 1:
+        return [replay_file(path, seed) for path in paths]
+    # not a multiprocessing Pool: its workers are daemons, so a script
+    # could not start the SimulationPool of the workers command
+    with ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as executor:
+        return list(executor.map(replay_file, paths, [seed] * len(paths)))
+
+
+def latency_results(latencies: Dict[str, List[float]]) -> Dict[str, float]:
+    """ Percentiles and maximum of the latencies of each command name """
+    results: Dict[str, float] = {}
+    for name, times in sorted(latencies.items()):
+        for percentile, seconds in zip(PERCENTILES, np.percentile(times, PERCENTILES)):
+            results["{}/p{}".format(name, percentile)] = float(seconds)
+        results[name + "/max"] = max(times)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("files", nargs="+", help="GTP scripts to replay")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="number of processes that replay files")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the latency results to this JSON file")
+    parser.add_argument("--baseline", help="compare the latencies with the results in this JSON file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown against the baseline, as a fraction")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="write the results to the baseline file instead of comparing")
+    args = parser.parse_args(argv)
+    if args.save_baseline and not args.baseline:
+        parser.error("--save-baseline needs --baseline")
+
+    start = time.time()
+    replayed = replay_files(args.files, args.jobs, args.seed)
+    latencies: Dict[str, List[float]] = {}
+    unexpected = 0
+    for path, (tests, file_latencies) in zip(args.files, replayed):
+        for number, command, response, pattern, passed, known in tests:
+            if passed == known:
+                unexpected += not passed
+                print("{} {}:{}: {} -> {!r}, expected [{}]".format(
+                    "FAIL" if not passed else "UNEXPECTED PASS", path, number,
+                    command, response, pattern))
+        print("{}: {}/{} passed".format(
+            path, sum(passed for _, _, _, _, passed, _ in tests), len(tests)))
+        for name, times in file_latencies.items():
+            latencies.setdefault(name, []).extend(times)
+    print("{} unexpected failures, {:.2f}s".format(unexpected, time.time() - start))
+
+    print("{:24s} {:>6s} {:>10s} {:>10s} {:>10s} {:>10s}".format(
+        "command", "count", "p50 ms", "p90 ms", "p99 ms", "max ms"))
+    results = latency_results(latencies)
+    for name, times in sorted(latencies.items()):
+        print("{:24s} {:6d} {:10.3f} {:10.3f} {:10.3f} {:10.3f}".format(
+            name, len(times), *[results["{}/p{}".format(name, p)] * 1e3 for p in PERCENTILES],
+            results[name + "/max"] * 1e3))
+    if args.output:
+        write_results(args.output, results)
+    status = 1 if unexpected else 0
+    if args.baseline:
+        if args.save_baseline:
+            write_results(args.baseline, results)
+            return status
+        regressions = compare(results, load_results(args.baseline), args.threshold)
+        for name, before, after in regressions:
+            print("REGRESSION {}: {:.3f} ms -> {:.3f} ms ({:+.0%})".format(
+                name, before * 1e3, after * 1e3, after / before - 1))
+        if regressions:
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+mcts.py
+Monte Carlo tree search player for Ninuki.
+
+Each iteration selects a path with UCT, expands one new child, finishes
+the game with a rollout of the current policy ('random' or 'rule_based',
+see SimulationPlayer.simulate1) and backs up the result.
+The tree is kept between commands. Moves sent with play re-root it, so
+the search below the new root is reused by the next genmove.
+With pondering, the GTP connection also grows the tree while it waits
+for the next command, see ponder.
+"""
+
+import math
+import random
+from sys import stderr
+from typing import Callable, Dict, List, Optional
+
+from board import GoBoard
+from board_base import EMPTY, NO_POINT, PASS, GO_COLOR, GO_POINT, opponent
+from flat_monte_carlo import SimulationPlayer
+from time_control import search_stopped
+
+
+class TreeNode(object):
+    def __init__(self, move: GO_POINT, color: GO_COLOR, parent: Optional['TreeNode']) -> None:
+        """
+        move: the move leading to this node, NO_POINT for the root
+        color: the color that played move
+        """
+        self.move = move
+        self.color = color
+        self.parent = parent
+        self.children: Dict[int, TreeNode] = {}
+        # candidate moves that have no child yet, None before the first expansion
+        self.untried: Optional[List[int]] = None
+        self.visits: int = 0
+        # wins for color, draws count half
+        self.wins: float = 0.0
+
+    def is_fully_expanded(self) -> bool:
+        return self.untried is not None and not self.untried
+
+    def select_child(self, exploration: float) -> 'TreeNode':
+        """ Return the child with the highest UCT value """
+        log_visits = math.log(self.visits)
+        best = None
+        best_value = -1.0
+        for child in self.children.values():
+            value = child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits)
+            if value > best_value:
+                best = child
+                best_value = value
+        return best
+
+
+class MCTSPlayer(object):
+    def __init__(self):
+        # without a deadline, genmove runs this many iterations per root candidate
+        self.numSimulations = 10
+        self.explorationConstant = 0.7
+        self.root: Optional[TreeNode] = None
+        # position, side to move and policy the root belongs to
+        self.rootKey = None
+        # (move, visits, win rate) for each child of the root after genmove
+        self.moveStats = []
+        # pondering stops once the root has this many visits
+        self.ponderLimit = 100000
+
+    def reset(self) -> None:
+        """ Throw away the tree """
+        self.root = None
+        self.rootKey = None
+
+    def position_key(self, board: GoBoard, color: GO_COLOR, policy: str):
+        return (board.hash(), color, policy)
+
+    def genmove(self, board: GoBoard, color: GO_COLOR, policy: str, deadline=None):
+        """
+        Search from the current position and return the most visited move.
+        The board is used for the search and is unchanged on return.
+        """
+        num_candidates = self.set_root(board, color, policy)
+        if num_candidates == 0:
+            # stdout carries the GTP responses
+            stderr.write('No legal moves left. Pass\n')
+            self.moveStats = []
+            return PASS
+        if board.isGameOver():
+            # search_once adds no children to a finished game, and
+            # every move leads to the same result
+            self.moveStats = []
+            return self.root.untried[0]
+        budget = self.numSimulations * num_candidates
+        iterations = 0
+        while True:
+            if search_stopped(deadline) and self.root.children:
+                break
+            if deadline is None and iterations >= budget:
+                break
+            self.search_once(board, policy)
+            iterations += 1
+        self.moveStats = [(child.move, child.visits, child.wins / child.visits)
+                          for child in self.root.children.values()]
+        best = max(self.root.children.values(),
+                   key=lambda child: (child.visits, child.wins / child.visits))
+        return best.move
+
+    def ponder(self, board: GoBoard, policy: str, stopped: Callable[[], bool]) -> None:
+        """
+        Grow the tree of the current position until stopped() is true,
+        for the side to move in board, one search iteration at a time.
+        The next genmove, or play through update_with_move, keeps
+        the part of the tree that still applies.
+        """
+        if board.isGameOver():
+            return
+        if self.set_root(board, board.current_player, policy) == 0:
+            return
+        while self.root.visits < self.ponderLimit and not stopped():
+            self.search_once(board, policy)
+
+    def set_root(self, board: GoBoard, color: GO_COLOR, policy: str) -> int:
+        """
+        Keep the tree if it belongs to this position, else start a new one.
+        Returns the number of candidate moves at the root.
+        """
+        key = self.position_key(board, color, policy)
+        if self.root is None or self.rootKey != key:
+            self.root = TreeNode(NO_POINT, opponent(color), None)
+            self.rootKey = key
+        self.expand(self.root, board, color, policy)
+        return len(self.root.untried) + len(self.root.children)
+
+    def expand(self, node: TreeNode, board: GoBoard, color: GO_COLOR, policy: str) -> None:
+        """ Set the candidate moves of node when it is reached the first time """
+        if node.untried is None:
+            moves = SimulationPlayer().get_candidate_moves(board, color, policy)
+            node.untried = [int(move) for move in moves]
+
+    def search_once(self, board: GoBoard, policy: str) -> None:
+        """
+        One iteration of selection, expansion, rollout and backpropagation
+        """
+        depth = len(board.undo_stack)
+        node = self.root
+        while node.is_fully_expanded() and node.children:
+            node = node.select_child(self.explorationConstant)
+            board.play_move(node.move, node.color)
+        if not board.isGameOver():
+            color = board.current_player
+            self.expand(node, board, color, policy)
+            if node.untried:
+                i = random.randrange(len(node.untried))
+                node.untried[i], node.untried[-1] = node.untried[-1], node.untried[i]
+                move = node.untried.pop()
+                board.play_move(move, color)
+                child = TreeNode(move, color, node)
+                node.children[move] = child
+                node = child
+        if board.isGameOver():
+            winner = board.evalEndState()
+        else:
+            winner = SimulationPlayer().simulate1(board, policy)
+        while len(board.undo_stack) > depth:
+            board.undo_move()
+        while node is not None:
+            node.visits += 1
+            if winner == node.color:
+                node.wins += 1
+            elif winner == EMPTY:
+                node.wins += 0.5
+            node = node.parent
+
+    def update_with_move(self, board: GoBoard, move: GO_POINT, color: GO_COLOR,
+                         policy: str) -> None:
+        """
+        Called after move of color was played on board.
+        Re-roots the tree at that move if it was searched with policy,
+        else drops the tree: its candidate lists belong to its own policy.
+        """
+        if self.root is None:
+            return
+        child = self.root.children.get(int(move))
+        if child is None or child.color != color or self.rootKey[2] != policy:
+            self.reset()
+            return
+        child.parent = None
+        self.root = child
+        self.rootKey = self.position_key(board, opponent(color), policy)
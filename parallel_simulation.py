@@ -0,0 +1,224 @@
+"""
+parallel_simulation.py
+Runs the rollouts of SimulationPlayer.genmove on a pool of worker processes.
+
+The pool is created once and reused for every genmove.
+The position is written into a shared memory block that every worker
+attaches to when it starts, so a task only carries its candidate moves,
+the number of rollouts and a seed. Each task seeds its own random number
+generators, so with a fixed seed the result does not depend on which
+worker runs which task.
+A stop request of the GTP connection reaches the workers through a flag
+in the same block, so their tasks return early too.
+"""
+
+import atexit
+import random
+import time
+from multiprocessing import Pool, TimeoutError, shared_memory
+from sys import stderr
+from typing import List, Tuple
+
+import numpy as np
+
+from board import GoBoard
+from board_base import GO_COLOR, GO_POINT, MAXSIZE, PASS, board_array_size
+from flat_monte_carlo import SimulationPlayer
+from time_control import STOP_SEARCH, search_stopped
+
+"""
+Layout of the shared position: a header followed by the padded board array.
+"""
+VERSION, SIZE, BLACK_CAPTURES, WHITE_CAPTURES, CURRENT_PLAYER, STOP = range(6)
+HEADER_SIZE: int = 6
+POSITION_SIZE: int = HEADER_SIZE + board_array_size(MAXSIZE)
+
+# state of a worker process, set up by _init_worker
+_worker_memory = None
+_worker_position = None
+_worker_board = None
+_worker_version = -1
+# empty_points and empty_index of the loaded position, see _load_board
+_worker_empty = None
+
+
+def _init_worker(name: str) -> None:
+    """
+    Attach to the shared position and warm up the board and rollout code
+    """
+    global _worker_memory, _worker_position
+    # workers share the resource tracker of the parent, which unlinks
+    # the block once, in SimulationPool.close
+    _worker_memory = shared_memory.SharedMemory(name=name)
+    _worker_position = np.ndarray(POSITION_SIZE, dtype=np.int32, buffer=_worker_memory.buf)
+    STOP_SEARCH.attach(_worker_position[STOP:STOP + 1])
+    board = GoBoard(7)
+    SimulationPlayer().simulate1(board, 'random')
+
+
+def _load_board() -> GoBoard:
+    """
+    Return the shared position as a GoBoard.
+    The board is rebuilt only when the parent has written a new position.
+    Rollouts take back their moves, but undo_move leaves the empty points
+    in a different order, and random_empty_point draws by index; so the
+    order of the loaded position is restored for every task, which then
+    draws the same points whichever tasks ran on the worker before.
+    """
+    global _worker_board, _worker_version, _worker_empty
+    version = int(_worker_position[VERSION])
+    if _worker_version != version:
+        size = int(_worker_position[SIZE])
+        if _worker_board is None or _worker_board.size != size:
+            _worker_board = GoBoard(size)
+        _worker_board.set_position(
+            _worker_position[HEADER_SIZE:HEADER_SIZE + board_array_size(size)],
+            int(_worker_position[BLACK_CAPTURES]),
+            int(_worker_position[WHITE_CAPTURES]),
+            int(_worker_position[CURRENT_PLAYER]))
+        _worker_version = version
+        _worker_empty = (_worker_board.empty_points.copy(), _worker_board.empty_index.copy())
+    _worker_board.empty_points = _worker_empty[0].copy()
+    _worker_board.empty_index = _worker_empty[1].copy()
+    return _worker_board
+
+
+def _simulate_task(task: Tuple) -> Tuple[List[float], List[int]]:
+    """
+    Run the rollouts of one task.
+    Returns for each move the number of wins for player, counting draws
+    as half a win, and the number of rollouts. After a stop request the
+    moves not simulated yet are left out, and unfinished batch rollouts
+    are not counted.
+    """
+    moves, player, policy, num_simulations, seed = task
+    board = _load_board()
+    random.seed(seed)
+    np.random.seed(seed)
+    simulation_player = SimulationPlayer()
+    simulation_player.numSimulations = num_simulations
+    if policy == 'random' and simulation_player.useBatch:
+        return simulation_player.simulate_batch(board, moves, player)
+    wins = []
+    for move in moves:
+        if STOP_SEARCH.is_set():
+            break
+        wins.append(simulation_player.simulate(board, move, player, policy) * num_simulations)
+    return wins, [num_simulations] * len(wins)
+
+
+class SimulationPool(object):
+    def __init__(self, num_workers: int) -> None:
+        """
+        Start num_workers worker processes and the shared position they read.
+        """
+        self.num_workers: int = num_workers
+        self.memory = shared_memory.SharedMemory(
+            create=True, size=POSITION_SIZE * np.dtype(np.int32).itemsize)
+        self.position = np.ndarray(POSITION_SIZE, dtype=np.int32, buffer=self.memory.buf)
+        self.position[:] = 0
+        self.pool = Pool(num_workers, initializer=_init_worker,
+                         initargs=(self.memory.name,))
+        # (move, visits, win rate) for each candidate of the last genmove
+        self.moveStats = []
+        atexit.register(self.close)
+
+    def close(self) -> None:
+        """ Stop the workers and free the shared position """
+        if self.pool is None:
+            return
+        self.pool.terminate()
+        self.pool.join()
+        self.pool = None
+        del self.position
+        self.memory.close()
+        self.memory.unlink()
+
+    def write_position(self, board: GoBoard) -> None:
+        """ Publish board as the position for the following tasks """
+        maxpoint = board_array_size(board.size)
+        self.position[HEADER_SIZE:HEADER_SIZE + maxpoint] = board.board
+        self.position[SIZE] = board.size
+        self.position[BLACK_CAPTURES] = board.black_captures
+        self.position[WHITE_CAPTURES] = board.white_captures
+        self.position[CURRENT_PLAYER] = board.current_player
+        self.position[STOP] = 0
+        self.position[VERSION] += 1
+
+    def make_tasks(self, moves: List[GO_POINT], player: GO_COLOR, policy: str,
+                   num_simulations: int) -> List[Tuple[List[int], Tuple]]:
+        """
+        Split the candidate moves into chunks, one task per chunk.
+        Random rollouts of a chunk run as one batch, so there is one chunk
+        per worker; policy rollouts use smaller chunks to balance the load.
+        If there are fewer moves than workers, the rollouts of each move are
+        split into several parts instead.
+        Returns pairs (move indices, task).
+        """
+        if policy == 'random' and SimulationPlayer().useBatch:
+            num_chunks = min(len(moves), self.num_workers)
+        else:
+            num_chunks = min(len(moves), 4 * self.num_workers)
+        parts = max(1, min(num_simulations, -(-self.num_workers // len(moves))))
+        base_seed = random.getrandbits(32)
+        tasks = []
+        for chunk in range(num_chunks):
+            indices = list(range(chunk, len(moves), num_chunks))
+            chunk_moves = [int(moves[i]) for i in indices]
+            for part in range(parts):
+                n = num_simulations // parts + (part < num_simulations % parts)
+                seed = hash((base_seed, chunk, part)) & 0xFFFFFFFF
+                tasks.append((indices, (chunk_moves, player, policy, n, seed)))
+        return tasks
+
+    def genmove(self, board: GoBoard, player: GO_COLOR, policy: str,
+                num_simulations: int = 10, deadline: float = None):
+        """
+        Same as SimulationPlayer.genmove, with the rollouts of all
+        candidate moves run on the worker processes.
+        With a deadline, rounds of num_simulations rollouts per move are
+        repeated while the next round is expected to finish in time.
+        A stop request, or the deadline passing in the middle of a round,
+        is passed on to the workers, which return what they have
+        simulated so far.
+        """
+        simulation_player = SimulationPlayer()
+        legal_moves = simulation_player.get_candidate_moves(board, player, policy)
+        if simulation_player.useSymmetry:
+            legal_moves = simulation_player.unique_moves(board, legal_moves)
+        if len(legal_moves) == 0:
+            # stdout carries the GTP responses
+            stderr.write('No legal moves left. Pass\n')
+            self.moveStats = []
+            return PASS
+        self.write_position(board)
+        wins = [0.0] * len(legal_moves)
+        visits = [0] * len(legal_moves)
+        while True:
+            start = time.time()
+            tasks = self.make_tasks(legal_moves, player, policy, num_simulations)
+            results = self.pool.imap(_simulate_task, [task for _, task in tasks], chunksize=1)
+            # results come back in task order, so the merge is deterministic
+            for indices, task in tasks:
+                task_wins, task_visits = self.next_result(results, deadline)
+                for i, w, v in zip(indices, task_wins, task_visits):
+                    wins[i] += w
+                    visits[i] += v
+            elapsed = time.time() - start
+            if deadline is None or search_stopped(deadline - elapsed):
+                break
+        simulation_player.record_stats(legal_moves, wins, visits)
+        self.moveStats = simulation_player.moveStats
+        return simulation_player.best_move(legal_moves, wins, visits)
+
+    def next_result(self, results, deadline: float = None) -> Tuple[List[float], List[int]]:
+        """
+        Wait for the next task result, and tell the workers to stop
+        if a stop is requested or the deadline passes meanwhile
+        """
+        while True:
+            try:
+                return results.next(timeout=0.05)
+            except TimeoutError:
+                if search_stopped(deadline):
+                    self.position[STOP] = 1
@@ -0,0 +1,231 @@
+"""
+pattern_policy.py
+Rollout policy driven by local line patterns.
+
+The pattern of an empty point p in line direction d is the contents of
+the eight points p-4d .. p-d, p+d .. p+4d, seen from the player to move:
+EMPTY, own stone, opponent stone or BORDER. A table indexed by the
+pattern gives the features of playing p along that line: own five,
+opponent five (so p blocks it), open four, capture, opponent capture.
+The features of p are the union over its four lines.
+
+The table is computed from the rule_based definitions in board.py and
+stored as a binary file of 4^8 bytes, pattern_table.bin, which is
+loaded on first use. Regenerate it with
+
+    python3 pattern_policy.py
+
+PatternPolicy has two modes. In exact mode it gives the same move
+classes as PolicyPlayer.get_policy_moves: the only part of BlockWin that
+is not local (captures that break an opponent four) comes from the
+bitboards. The engine uses it as the pattern_exact policy, for
+policy_moves, genmove candidates and rollouts alike. Otherwise, as the
+pattern policy, it samples every empty point with a weight given by its
+strongest feature.
+"""
+
+import os
+import random
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from board import GoBoard
+from board_base import EMPTY, BORDER, GO_COLOR, GO_POINT, bits_to_points, opponent
+
+PATTERN_FILE: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pattern_table.bin")
+PATTERN_CELLS: int = 8
+NUM_PATTERNS: int = 4 ** PATTERN_CELLS
+
+"""
+Cell values of a pattern, relative to the player to move
+"""
+OWN: int = 1
+OPP: int = 2
+
+"""
+Feature bits of the pattern table
+"""
+WIN: int = 1
+OPP_WIN: int = 2
+OPEN_FOUR: int = 4
+CAPTURE: int = 8
+OPP_CAPTURE: int = 16
+NUM_FEATURE_SETS: int = 32
+
+"""
+Weight of a point in the sampling mode, by the strongest rule_based
+class its features put it in
+"""
+WIN_WEIGHT: float = 4096.0
+BLOCK_WIN_WEIGHT: float = 512.0
+OPEN_FOUR_WEIGHT: float = 64.0
+CAPTURE_WEIGHT: float = 8.0
+DEFAULT_WEIGHT: float = 1.0
+
+# board value -> cell value, for each color to move
+RELATIVE: List[np.ndarray] = [
+    np.array([EMPTY, BORDER, BORDER, BORDER], dtype=np.intp),
+    np.array([EMPTY, OWN, OPP, BORDER], dtype=np.intp),
+    np.array([EMPTY, OPP, OWN, BORDER], dtype=np.intp),
+]
+POWERS: np.ndarray = 4 ** np.arange(PATTERN_CELLS, dtype=np.intp)
+
+
+def pattern_features(cells: Tuple[int, ...]) -> int:
+    """
+    Features of playing the center of a line pattern.
+    cells are the values at offsets -4, -3, -2, -1, 1, 2, 3, 4.
+    The conditions are those of win_points_bits, capture_points_bits and
+    open_four_points_bits in board.py, restricted to one line.
+    """
+    def cell(k: int) -> int:
+        return cells[k + 4] if k < 0 else cells[k + 3]
+
+    def own(k: int) -> bool:
+        return cell(k) == OWN
+
+    features = 0
+    for start in range(-4, 1):
+        others = [cell(k) for k in range(start, start + 5) if k != 0]
+        if all(c == OWN for c in others):
+            features |= WIN
+        if all(c == OPP for c in others):
+            features |= OPP_WIN
+    for s in [1, -1]:
+        if cell(s) == OPP and cell(2 * s) == OPP and cell(3 * s) == OWN:
+            features |= CAPTURE
+        if cell(s) == OWN and cell(2 * s) == OWN and cell(3 * s) == OPP:
+            features |= OPP_CAPTURE
+        # (stones on + side, stones on - side) = (3, 0), (2, 1), (1, 2)
+        if own(s) and own(2 * s) and own(3 * s) and not own(4 * s) and cell(-s) == EMPTY:
+            features |= OPEN_FOUR
+        if own(s) and own(2 * s) and not own(3 * s) and own(-s) and cell(-2 * s) == EMPTY:
+            features |= OPEN_FOUR
+        if own(s) and not own(2 * s) and own(-s) and own(-2 * s) and cell(-3 * s) == EMPTY:
+            features |= OPEN_FOUR
+    return features
+
+
+def build_table() -> np.ndarray:
+    """ Features of all 4^8 patterns, indexed by sum(cells[i] * 4^i) """
+    table = np.zeros(NUM_PATTERNS, dtype=np.uint8)
+    for index in range(NUM_PATTERNS):
+        cells = tuple((index >> (2 * i)) & 3 for i in range(PATTERN_CELLS))
+        table[index] = pattern_features(cells)
+    return table
+
+
+def write_table(path: str = PATTERN_FILE) -> None:
+    build_table().tofile(path)
+
+
+_table: Optional[np.ndarray] = None
+
+
+def get_pattern_table() -> np.ndarray:
+    """
+    The shared pattern table, read from PATTERN_FILE,
+    or built if the file is missing or has the wrong size
+    """
+    global _table
+    if _table is None:
+        table = None
+        if os.path.exists(PATTERN_FILE):
+            table = np.fromfile(PATTERN_FILE, dtype=np.uint8)
+        if table is None or table.size != NUM_PATTERNS:
+            table = build_table()
+        _table = table
+    return _table
+
+
+_weights: Dict[Tuple[int, int], np.ndarray] = {}
+
+
+def get_feature_weights(win_features: int, block_features: int) -> np.ndarray:
+    """
+    Weight of every feature set. win_features and block_features are the
+    features that count as Win and BlockWin, they include the captures
+    when a player is close to winning by captures.
+    """
+    key = (win_features, block_features)
+    if key in _weights:
+        return _weights[key]
+    weights = np.full(NUM_FEATURE_SETS, DEFAULT_WEIGHT)
+    for features in range(NUM_FEATURE_SETS):
+        for bits, weight in [(win_features, WIN_WEIGHT),
+                             (block_features, BLOCK_WIN_WEIGHT),
+                             (OPEN_FOUR, OPEN_FOUR_WEIGHT),
+                             (CAPTURE, CAPTURE_WEIGHT)]:
+            if features & bits:
+                weights[features] = weight
+                break
+    _weights[key] = weights
+    return weights
+
+
+class PatternPolicy(object):
+    def __init__(self, exact: bool = False) -> None:
+        """
+        exact: sample uniformly from the rule_based move class, as
+        PolicyPlayer does, instead of by pattern weight
+        """
+        self.exact = exact
+        self.table = get_pattern_table()
+
+    def point_features(self, board: GoBoard, color: GO_COLOR) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The empty points and the feature bits of each, for color to move.
+        One table lookup per point and line direction.
+        """
+        points = np.array(board.empty_points, dtype=np.intp)
+        cells = RELATIVE[color][board.board][board.geometry.line_windows[points]]
+        patterns = cells @ POWERS
+        return points, np.bitwise_or.reduce(self.table[patterns], axis=1)
+
+    def win_block_features(self, board: GoBoard, color: GO_COLOR) -> Tuple[int, int]:
+        """ The features that make a point a Win or a BlockWin move """
+        win_features = WIN
+        block_features = OPP_WIN
+        if board.get_captures(color) >= 8:
+            win_features |= CAPTURE
+        if board.get_captures(opponent(color)) >= 8:
+            block_features |= OPP_CAPTURE
+        return win_features, block_features
+
+    def get_policy_points(self, board: GoBoard, color: GO_COLOR) -> Tuple[str, List[GO_POINT]]:
+        """
+        Move type and moves in increasing order,
+        the same as PolicyPlayer.get_policy_points with the rule_based policy
+        """
+        points, features = self.point_features(board, color)
+        win_features, block_features = self.win_block_features(board, color)
+        wins = points[(features & win_features) != 0]
+        if wins.size:
+            return 'Win', sorted(wins.tolist())
+        blocks = set(points[(features & block_features) != 0].tolist())
+        opponent_fours = board.consecutive_fours_bits(opponent(color))
+        if opponent_fours:
+            blocks.update(bits_to_points(board.capture_points_bits(color, opponent_fours)))
+        if blocks:
+            return 'BlockWin', sorted(blocks)
+        for moveType, bits in [('OpenFour', OPEN_FOUR), ('Capture', CAPTURE)]:
+            moves = points[(features & bits) != 0]
+            if moves.size:
+                return moveType, sorted(moves.tolist())
+        return 'Random', sorted(points.tolist())
+
+    def sample(self, board: GoBoard, color: GO_COLOR) -> GO_POINT:
+        """ Choose the rollout move of color """
+        if self.exact:
+            _, moves = self.get_policy_points(board, color)
+            return random.choice(moves)
+        points, features = self.point_features(board, color)
+        weights = get_feature_weights(*self.win_block_features(board, color))
+        cumulative = np.cumsum(weights[features])
+        i = int(np.searchsorted(cumulative, random.random() * cumulative[-1], side='right'))
+        return int(points[min(i, points.size - 1)])
+
+
+if __name__ == "__main__":
+    write_table()
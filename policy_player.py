@@ -1,4 +1,5 @@
 from board import GoBoard
+from pattern_policy import PatternPolicy
 from board_util import GoBoardUtil
 from typing import List, Tuple
 from engine import GoEngine
@@ -10,6 +11,7 @@ from board_base import (
     GO_COLOR, GO_POINT,
     PASS,
     MAXSIZE,
+    bits_to_points,
     coord_to_point,
     opponent
 )
@@ -24,176 +26,103 @@ class PolicyPlayer(object):
     def __init__(self):
         pass
     def get_policy_moves(self, board: GoBoard, color: GO_COLOR, policy):
-        board_size = board.size
-        if policy == 'random':
-            return 'Random', scanRandom(board, color, board_size)
-        winMoves = scanWin(board, color, board_size)
-        if len(winMoves) > 0:
-            return 'Win', winMoves
-        blockWinMoves = scanBlockWin(board, color, board_size)
-        if len(blockWinMoves) > 0:
-            return 'BlockWin',blockWinMoves
-        openFourMoves = scanOpenFour(board, color, board_size)
-        if len(openFourMoves) > 0:
-            return 'OpenFour', openFourMoves
-        captureMoves = scanCapture(board, color, board_size)
-        if len(captureMoves) > 0:
-            return 'Capture', captureMoves
-        return 'Random', scanRandom(board, color, board_size)
+        moveType, moves = self.get_policy_bits(board, color, policy)
+        return moveType, format_moves(moves, board.size)
+
+    def get_policy_points(self, board: GoBoard, color: GO_COLOR, policy) -> Tuple[str, List[GO_POINT]]:
+        '''
+        Same as get_policy_moves, with the moves as points in increasing order.
+        Used by the engine, which has no need for move strings.
+        '''
+        moveType, moves = self.get_policy_bits(board, color, policy)
+        return moveType, bits_to_points(moves)
+
+    def get_policy_bits(self, board: GoBoard, color: GO_COLOR, policy) -> Tuple[str, int]:
+        '''
+        Move type and bitboard of the policy moves.
+        The classes are tried in order and the first one with a move wins,
+        so the later scans only run when the earlier ones are empty.
+        The pattern_exact policy finds the same classes from the pattern
+        table, see pattern_policy.py.
+        '''
+        if policy == 'pattern_exact':
+            moveType, points = PatternPolicy(exact=True).get_policy_points(board, color)
+            return moveType, sum(1 << point for point in points)
+        if policy != 'random':
+            for moveType, scan in POLICY_SCANS:
+                moves = scan(board, color)
+                if moves:
+                    return moveType, moves
+        return 'Random', board.bitboards[EMPTY]
+
+    def get_ordered_moves(self, board: GoBoard, color: GO_COLOR):
+        '''
+        All empty points, ordered by policy class:
+        Win, BlockWin, OpenFour and Capture moves first, then the rest.
+        Within a class the points are in increasing order.
+        '''
+        ordered = []
+        seen = 0
+        for _, scan in POLICY_SCANS:
+            new = scan(board, color) & ~seen
+            ordered.extend(bits_to_points(new))
+            seen |= new
+        ordered.extend(bits_to_points(board.bitboards[EMPTY] & ~seen))
+        return ordered
 
 def scanWin(board: GoBoard, color, board_size):
+    return format_moves(scanWinBits(board, color), board_size)
+
+def scanBlockWin(board: GoBoard, color, board_size):
+    return format_moves(scanBlockWinBits(board, color), board_size)
+
+def scanOpenFour(board: GoBoard, color, board_size):
+    return format_moves(scanOpenFourBits(board, color), board_size)
+
+def scanCapture(board: GoBoard, color, board_size):
+    return format_moves(scanCaptureBits(board, color), board_size)
+
+def scanRandom(board: GoBoard, color, board_size):
+    return format_moves(board.bitboards[EMPTY], board_size)
+
+def scanWinBits(board: GoBoard, color):
     # scan for win moves
-    winMoves = set()
-    for point in board.get_empty_points():
-        for noc in board.neighbors_of_color(point, color):
-            direction = noc - point
-            pos_direction_count = 1
-            try:
-                for i in range(2, 5):
-                    if board.get_color(point+direction*i) == color:
-                        pos_direction_count += 1
-                    else:
-                        raise Exception
-            except:
-                pass
-            neg_direction_count = 1
-            try:
-                for i in range(1, 5):
-                    if board.get_color(point-direction*i) == color:
-
-                        neg_direction_count += 1
-                    else:
-                        raise Exception
-            except:
-                pass
-            if pos_direction_count + neg_direction_count >= 5:
-                isWinMove = True
-            else:
-                isWinMove = False
-            if isWinMove:
-                winMoves.add(format_point(point_to_coord(point,board_size)).lower())
+    winMoves = board.win_points_bits(color)
     if board.get_captures(color)>=8:
-        captureMoves = scanCapture(board, color, board_size)
-        winMoves = winMoves.union(captureMoves)
-    return sorted(winMoves)
+        winMoves |= board.capture_points_bits(color)
+    return winMoves
 
-def scanBlockWin(board: GoBoard, color, board_size):
+def scanBlockWinBits(board: GoBoard, color):
     # scan for block win moves
-    blockWinMoves = set()
-    for point in board.get_empty_points():
-        for noc in board.neighbors_of_color(point, opponent(color)):
-            direction = noc - point
-            pos_direction_count = 1
-            try:
-                for i in range(2, 5):
-                    if board.get_color(point+direction*i) == opponent(color):
-                        pos_direction_count += 1
-                    else:
-                        raise Exception
-            except:
-                pass
-            neg_direction_count = 1
-            try:
-                for i in range(1, 5):
-                    if board.get_color(point-direction*i) == opponent(color):
-                        neg_direction_count += 1
-                    else:
-                        raise Exception
-            except:
-                pass
-            if pos_direction_count + neg_direction_count >= 5:
-                isBlockWinMove = True
-            else:    
-                isBlockWinMove = False
-
-            if isBlockWinMove:
-                blockWinMoves.add(format_point(point_to_coord(point,board_size)).lower())
-    #print(blockWinMoves)
+    blockWinMoves = board.win_points_bits(opponent(color))
     # now scan open fours for the oppoenent and look for moves that capture them
     # make sure the fours are open fours not just any fours
-    opponentOpenFour = board.getConsecutiveFours(opponent(color))
-    #print(opponentOpenFour)
-    captureOpenFourMoves = set()
-    for point in board.get_empty_points():
-        for noc in board.neighbors_of_color(point, opponent(color)):
-            isCaptureOpenFourMove = True
-            direction = noc - point
-            try:
-                if not (board.get_color(point+direction*2) == opponent(color) and board.get_color(point+direction*3) == color):
-                    raise Exception
-                #print("Black Capture Count", board.get_captures(color))
-                #print("White Capture Count", board.get_captures(WHITE))
-                #print("current player", color)
-                if not (noc in opponentOpenFour or noc + direction in opponentOpenFour):
-                    raise Exception
-            except:
-                isCaptureOpenFourMove = False
-
-            if isCaptureOpenFourMove:
-                captureOpenFourMoves.add(format_point(point_to_coord(point,board_size)).lower())
+    opponentOpenFour = board.consecutive_fours_bits(opponent(color))
+    blockWinMoves |= board.capture_points_bits(color, opponentOpenFour)
     if board.get_captures(opponent(color))>=8:
-        captureMoves = scanCapture(board, opponent(color), board_size)
-        blockWinMoves = blockWinMoves.union(captureMoves)
-    return sorted(blockWinMoves.union(captureOpenFourMoves))
+        blockWinMoves |= board.capture_points_bits(opponent(color))
+    return blockWinMoves
 
-def scanOpenFour(board: GoBoard, color, board_size):
+def scanOpenFourBits(board: GoBoard, color):
     # scan for open four moves
-    openFourMoves = set()
-    for point in board.get_empty_points():
-        for noc in board.neighbors_of_color(point, color):
-            direction = noc - point
-            pos_direction_count = 1
-            try:
-                for i in range(2, 5):
-                    if board.get_color(point+direction*i) == color:
-                        pos_direction_count += 1
-                    else:
-                        raise Exception
-            except:
-                pass
-            neg_direction_count = 1
-            try:
-                for i in range(1, 5):
-                    if board.get_color(point-direction*i) == color:
-
-                        neg_direction_count += 1
-                    else:
-                        raise Exception
-            except:
-                pass
-            try:
-                if pos_direction_count + neg_direction_count == 4 and (board.get_color(point+direction*pos_direction_count) == EMPTY or board.get_color(point-direction*neg_direction_count) == EMPTY):
-                    isOpenFourMove = True
-                else:
-                    isOpenFourMove = False
-            except:
-                isOpenFourMove = False
-
-            if isOpenFourMove:
-                openFourMoves.add(format_point(point_to_coord(point,board_size)).lower() )
-    return sorted(openFourMoves)
-
-def scanCapture(board: GoBoard, color, board_size):
-    captureMoves = set()
-    for point in board.get_empty_points():
-        for noc in board.neighbors_of_color(point, opponent(color)):
-            isCaptureMove = True
-            direction = noc - point
-            try:
-                if not (board.get_color(point+direction*2) == opponent(color) and board.get_color(point+direction*3) == color):
-                    raise Exception
-            except:
-                isCaptureMove = False
-
-            if isCaptureMove:
-                captureMoves.add(format_point(point_to_coord(point,board_size)).lower() )
-    return sorted(captureMoves)
-
-def scanRandom(board: GoBoard, color, board_size):
-    return sorted(format_point(point_to_coord(point,board_size)).lower() for point in board.get_empty_points())
+    return board.open_four_points_bits(color)
 
+def scanCaptureBits(board: GoBoard, color):
+    return board.capture_points_bits(color)
 
+# policy move classes in order of priority, see get_policy_bits
+POLICY_SCANS = [
+    ('Win', scanWinBits),
+    ('BlockWin', scanBlockWinBits),
+    ('OpenFour', scanOpenFourBits),
+    ('Capture', scanCaptureBits),
+]
 
+def format_moves(bits: int, board_size):
+    """
+    Return the points of a bitboard as a sorted list of lowercase moves
+    """
+    return sorted(format_point(point_to_coord(point,board_size)).lower() for point in bits_to_points(bits))
 
 
 def point_to_coord(point: GO_POINT, boardsize: int) -> Tuple[int, int]:
@@ -0,0 +1,270 @@
+"""
+position_cache.py
+Persistent store of position results, shared across games and processes.
+
+A record holds, for one position (board size and canonical hash, so the
+eight symmetric images of a position share it, see GoBoard.canonical_hash):
+    visits, wins: rollouts through the position and the wins among them
+        for the player who moved into it, draws counting half, as for a
+        node of mcts.py
+    solved: the winner found by the solver, UNKNOWN if not solved
+    best_move: the winning or drawing move found by the solver for the
+        side to move, 0 if none, in the orientation of the canonical position
+
+The store is a directory with two files of fixed-size binary records:
+    positions.bin: the table, sorted by hash, with one record per position.
+        It is memory-mapped and searched in place, so opening it costs
+        nothing however large it is.
+    positions.log: new records, appended with one write each, so that
+        several engines can add to it at the same time.
+The engines only read the table. Records from the log reach it through
+compaction, which merges them into the table offline:
+
+    python3 position_cache.py compact [DIRECTORY]
+
+Compaction first renames the log, so engines may keep appending meanwhile;
+their records go to a new log.
+"""
+
+import bisect
+import mmap
+import os
+import sys
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from board import GoBoard
+from board_base import GO_COLOR, GO_POINT
+
+DEFAULT_DIRECTORY: str = "position_cache"
+TABLE_FILE: str = "positions.bin"
+LOG_FILE: str = "positions.log"
+MAGIC: bytes = b"NINUKIP1"
+
+UNKNOWN: int = 255
+
+RECORD = np.dtype([
+    ('hash', '<u8'),
+    ('size', 'u1'),
+    ('solved', 'u1'),
+    ('best_move', '<u2'),
+    ('visits', '<u4'),
+    ('wins', '<f8'),
+])
+
+
+def position_key(board: GoBoard) -> int:
+    """ The hash that identifies the position of board in the cache """
+    return board.canonical_hash()[0]
+
+
+def to_canonical(board: GoBoard, move: GO_POINT) -> GO_POINT:
+    """ move on board, as a move on the canonical position """
+    return int(board.geometry.symmetries[board.canonical_hash()[1], move])
+
+
+def from_canonical(board: GoBoard, move: GO_POINT) -> GO_POINT:
+    """ A move on the canonical position, as a move on board """
+    return int(board.geometry.inverse_symmetries[board.canonical_hash()[1], move])
+
+
+def make_records(count: int) -> np.ndarray:
+    records = np.zeros(count, dtype=RECORD)
+    records['solved'] = UNKNOWN
+    return records
+
+
+def read_table(path: str) -> np.ndarray:
+    """ The records of a table file, an empty array if there is none """
+    if not os.path.exists(path) or os.path.getsize(path) <= len(MAGIC):
+        return make_records(0)
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("{} is not a position table".format(path))
+        return np.frombuffer(f.read(), dtype=RECORD).copy()
+
+
+def read_log(path: str) -> np.ndarray:
+    """ The records of a log file; a partly written last record is ignored """
+    if not os.path.exists(path):
+        return make_records(0)
+    with open(path, "rb") as f:
+        data = f.read()
+    usable = len(data) - len(data) % RECORD.itemsize
+    return np.frombuffer(data[:usable], dtype=RECORD).copy()
+
+
+def merge(records: np.ndarray) -> np.ndarray:
+    """
+    One record per position, sorted by hash. Rollouts are added up,
+    solved and best_move come from the last record that has them.
+    """
+    if records.size == 0:
+        return records
+    order = np.lexsort((records['size'], records['hash']))
+    records = records[order]
+    changed = (records['hash'][1:] != records['hash'][:-1]) | \
+              (records['size'][1:] != records['size'][:-1])
+    starts = np.concatenate([[0], np.nonzero(changed)[0] + 1])
+    merged = records[starts].copy()
+    merged['visits'] = np.add.reduceat(records['visits'], starts)
+    merged['wins'] = np.add.reduceat(records['wins'], starts)
+    # lexsort is stable, so the last record of a group with a field set
+    # is the one written last
+    index = np.arange(records.size)
+    for field, missing in [('solved', UNKNOWN), ('best_move', 0)]:
+        last = np.maximum.reduceat(np.where(records[field] != missing, index, -1), starts)
+        found = last >= starts
+        merged[field][found] = records[field][last[found]]
+    return merged
+
+
+def compact(directory: str = DEFAULT_DIRECTORY) -> int:
+    """
+    Merge the log into the table. Returns the number of positions.
+    """
+    table_path = os.path.join(directory, TABLE_FILE)
+    log_path = os.path.join(directory, LOG_FILE)
+    pending_path = log_path + ".compacting"
+    # a log left over from an interrupted compaction is merged as well
+    if os.path.exists(log_path) and not os.path.exists(pending_path):
+        os.replace(log_path, pending_path)
+    merged = merge(np.concatenate([read_table(table_path), read_log(pending_path)]))
+    temp_path = table_path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(merged.tobytes())
+    os.replace(temp_path, table_path)
+    if os.path.exists(pending_path):
+        os.remove(pending_path)
+    return merged.size
+
+
+class PositionCache(object):
+    def __init__(self, directory: str = DEFAULT_DIRECTORY) -> None:
+        """
+        Open the store in directory, creating the directory if needed.
+        The table is mapped as it is now; records written after that,
+        by this or other processes, are seen after the next compaction.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.log_path = os.path.join(directory, LOG_FILE)
+        # genmove results are only stored for positions with at most this many stones
+        self.maxStones = 12
+        # a book move needs at least this many stored rollouts for every candidate
+        self.minVisits = 100
+        self.table = make_records(0)
+        self.map: Optional[mmap.mmap] = None
+        table_path = os.path.join(directory, TABLE_FILE)
+        if os.path.exists(table_path) and os.path.getsize(table_path) > len(MAGIC):
+            with open(table_path, "rb") as f:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if self.map[:len(MAGIC)] != MAGIC:
+                raise ValueError("{} is not a position table".format(table_path))
+            count = (len(self.map) - len(MAGIC)) // RECORD.itemsize
+            self.table = np.frombuffer(self.map, dtype=RECORD, count=count, offset=len(MAGIC))
+
+    def close(self) -> None:
+        self.table = make_records(0)
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+    def lookup(self, board: GoBoard) -> Optional[np.void]:
+        """ The record of the position of board, None if there is none """
+        key = position_key(board)
+        # a view of the mapped table: np.searchsorted would first copy
+        # this strided column, reading the whole file on every lookup
+        hashes = self.table['hash']
+        i = bisect.bisect_left(hashes, np.uint64(key))
+        while i < hashes.size and hashes[i] == key:
+            if self.table['size'][i] == board.size:
+                # a copy, so no reference into the mapped file outlives close
+                return self.table[i:i + 1].copy()[0]
+            i += 1
+        return None
+
+    def append(self, records: np.ndarray) -> None:
+        """ Add records to the log with a single write """
+        fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, records.tobytes())
+        finally:
+            os.close(fd)
+
+    def solved(self, board: GoBoard) -> Optional[Tuple[GO_COLOR, Optional[GO_POINT]]]:
+        """ (winner, move) as returned by Solver.solve, None if not stored """
+        record = self.lookup(board)
+        if record is None or record['solved'] == UNKNOWN:
+            return None
+        move = int(record['best_move'])
+        return int(record['solved']), from_canonical(board, move) if move != 0 else None
+
+    def store_solved(self, board: GoBoard, winner: GO_COLOR, move: Optional[GO_POINT]) -> None:
+        records = make_records(1)
+        records['hash'] = position_key(board)
+        records['size'] = board.size
+        records['solved'] = winner
+        records['best_move'] = to_canonical(board, move) if move is not None else 0
+        self.append(records)
+
+    def book_move(self, board: GoBoard, color: GO_COLOR,
+                  moves: List[GO_POINT]) -> Optional[GO_POINT]:
+        """
+        The move to play without searching: the stored winning move if the
+        position is solved as a win for color, else the candidate with the
+        best stored win rate if every candidate has minVisits rollouts.
+        None if there is no such move.
+        """
+        solved = self.solved(board)
+        if solved is not None:
+            winner, move = solved
+            if winner == color and move is not None:
+                return move
+        if self.table.size == 0 or not moves:
+            return None
+        best = None
+        best_rate = -1.0
+        for move in moves:
+            board.play_move(move, color)
+            record = self.lookup(board)
+            board.undo_move()
+            if record is None or record['visits'] < self.minVisits:
+                return None
+            rate = record['wins'] / record['visits']
+            if rate > best_rate:
+                best = move
+                best_rate = rate
+        return best
+
+    def store_search(self, board: GoBoard, color: GO_COLOR,
+                     move_stats: List[Tuple[GO_POINT, int, float]]) -> None:
+        """
+        Store the result of a genmove of color on board: the rollouts of
+        each candidate, for the position after it, which is what book_move
+        reads. Only opening positions, see maxStones, are kept.
+        """
+        if board.size * board.size - len(board.empty_points) > self.maxStones:
+            return
+        move_stats = [(candidate, visits, rate) for candidate, visits, rate in move_stats if visits > 0]
+        if not move_stats:
+            return
+        records = make_records(len(move_stats))
+        records['size'] = board.size
+        for i, (candidate, visits, rate) in enumerate(move_stats):
+            board.play_move(candidate, color)
+            records['hash'][i] = position_key(board)
+            board.undo_move()
+            records['visits'][i] = visits
+            records['wins'][i] = rate * visits
+        self.append(records)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "compact":
+        print("Usage: python3 position_cache.py compact [DIRECTORY]")
+        sys.exit(1)
+    directory = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_DIRECTORY
+    print("{} positions".format(compact(directory)))
@@ -0,0 +1,152 @@
+"""
+solver.py
+Time-bounded solver for Ninuki positions.
+
+The search proves or disproves "attacker wins" with a boolean
+depth-first alpha-beta search: a node where attacker is to move is
+won as soon as one move wins, any other node is lost as soon as one move
+refutes the attack. Nodes cut off by the depth limit are unknown.
+Iterative deepening raises the limit until both "side to move wins" and
+"opponent wins" are decided, or the time runs out.
+Moves are searched in PolicyPlayer order: Win, BlockWin, OpenFour and
+Capture moves first.
+Decided results do not depend on the depth, so they are kept in a
+transposition table across iterations and across solve calls.
+"""
+
+import itertools
+import time
+from typing import List, Optional, Tuple
+
+from board import GoBoard
+from board_base import EMPTY, GO_COLOR, GO_POINT, opponent
+from policy_player import PolicyPlayer, scanWinBits
+from time_control import search_stopped
+
+
+class SearchTimeout(Exception):
+    """ Raised inside the search when the time limit is reached or stop is requested """
+    pass
+
+
+class TranspositionTable(object):
+    """
+    Direct-mapped table of search results, indexed by the Zobrist hash.
+    An entry is (key, attacker, result, depth) with result True or False
+    when decided, None when unknown after a search to depth.
+    On a collision decided results are kept over unknown ones,
+    and deeper unknown results over shallower ones.
+    """
+    def __init__(self, bits: int = 18) -> None:
+        self.mask: int = (1 << bits) - 1
+        self.entries: List[Optional[Tuple]] = [None] * (1 << bits)
+
+    def clear(self) -> None:
+        self.entries = [None] * len(self.entries)
+
+    def lookup(self, key: int, attacker: GO_COLOR) -> Optional[Tuple]:
+        entry = self.entries[(key ^ attacker) & self.mask]
+        if entry is not None and entry[0] == key and entry[1] == attacker:
+            return entry
+        return None
+
+    def store(self, key: int, attacker: GO_COLOR, result: Optional[bool], depth: int) -> None:
+        index = (key ^ attacker) & self.mask
+        old = self.entries[index]
+        if old is not None and old[2] is not None:
+            if result is None:
+                return
+        elif old is not None and result is None and old[3] > depth:
+            return
+        self.entries[index] = (key, attacker, result, depth)
+
+
+class Solver(object):
+    def __init__(self) -> None:
+        self.tt = TranspositionTable()
+        self.policy = PolicyPlayer()
+        self.deadline: float = 0.0
+        self.nodes: int = 0
+
+    def solve(self, board: GoBoard, timelimit: float) -> Tuple[Optional[GO_COLOR], Optional[GO_POINT]]:
+        """
+        Solve the position for the side to move within timelimit seconds.
+        Returns (winner, move) with winner BLACK, WHITE or EMPTY for a draw.
+        move is a winning move if the side to move wins, a drawing move
+        for a draw, and None if the opponent wins.
+        Returns (None, None) if the position was not solved in time.
+        """
+        if board.isGameOver():
+            return board.evalEndState(), None
+        self.deadline = time.time() + timelimit
+        self.nodes = 0
+        board = board.copy()
+        color = board.current_player
+        try:
+            # captures empty points again, so the game can last longer
+            # than the number of empty points; the time limit ends the loop
+            for depth in itertools.count(1):
+                wins, win_move = self.prove_root(board, color, depth)
+                if wins:
+                    return color, win_move
+                loses, draw_move = self.prove_root(board, opponent(color), depth)
+                if loses:
+                    return opponent(color), None
+                if wins is False and loses is False:
+                    return EMPTY, draw_move
+        except SearchTimeout:
+            return None, None
+
+    def prove_root(self, board: GoBoard, attacker: GO_COLOR,
+                   depth: int) -> Tuple[Optional[bool], Optional[GO_POINT]]:
+        """
+        Search the root to depth for attacker.
+        Returns the result and, if it is decided in favour of the side to
+        move, the move that decides it: a winning move if the side to move is
+        attacker, a move that refutes the attack otherwise.
+        """
+        color = board.current_player
+        result = self.prove(board, attacker, depth)
+        if result is None or result != (color == attacker):
+            return result, None
+        for move in self.policy.get_ordered_moves(board, color):
+            board.play_move(move, color)
+            child = self.prove(board, attacker, depth - 1)
+            board.undo_move()
+            if child == result:
+                return result, move
+        return result, None
+
+    def prove(self, board: GoBoard, attacker: GO_COLOR, depth: int) -> Optional[bool]:
+        """
+        Does attacker win from this position?
+        Returns True or False if decided within depth moves, None otherwise.
+        """
+        self.nodes += 1
+        if self.nodes & 255 == 0 and search_stopped(self.deadline):
+            raise SearchTimeout()
+        if board.isGameOver():
+            return board.evalEndState() == attacker
+        color = board.current_player
+        if scanWinBits(board, color):
+            return color == attacker
+        if depth == 0:
+            return None
+        key = board.hash()
+        entry = self.tt.lookup(key, attacker)
+        if entry is not None and (entry[2] is not None or entry[3] >= depth):
+            return entry[2]
+        # attacker to move looks for a True child, the defender for a False one
+        target = color == attacker
+        result = not target
+        for move in self.policy.get_ordered_moves(board, color):
+            board.play_move(move, color)
+            child = self.prove(board, attacker, depth - 1)
+            board.undo_move()
+            if child == target:
+                result = target
+                break
+            if child is None:
+                result = None
+        self.tt.store(key, attacker, result, depth)
+        return result
@@ -0,0 +1,68 @@
+"""
+telemetry.py
+Counters and timers for the rollouts of genmove.
+
+Telemetry is off by default. While it is off, simulate1 runs its usual
+loop and nothing is measured, so the only cost is one test per rollout.
+While it is on, each rollout ply records which policy class the move
+came from and the time spent on choosing the move (policy), playing it
+(play) and testing for the end of the game or a forced result (end). Batch rollouts are
+counted as a whole. During genmove a summary is written to stderr as
+gogui-gfx live output about once per live_interval seconds.
+
+The counters belong to the process: rollouts run on the worker processes
+of a SimulationPool are not included.
+"""
+
+import time
+from sys import stderr
+from typing import Dict, List
+
+POLICY_CLASSES: List[str] = ['Win', 'BlockWin', 'OpenFour', 'Capture', 'Random', 'Pattern']
+PHASES: List[str] = ['policy', 'play', 'end', 'batch']
+
+
+class Telemetry(object):
+    def __init__(self) -> None:
+        self.enabled: bool = False
+        # seconds between two gogui-gfx updates during genmove
+        self.live_interval: float = 1.0
+        self.reset()
+
+    def reset(self) -> None:
+        self.rollouts: int = 0
+        self.plies: int = 0
+        # rollouts ended early with a forced result
+        self.adjudicated: int = 0
+        self.times: Dict[str, float] = {phase: 0.0 for phase in PHASES}
+        self.policy_classes: Dict[str, int] = {moveType: 0 for moveType in POLICY_CLASSES}
+        self.last_live: float = time.time()
+
+    def end_rollouts(self, rollouts: int, plies: int) -> None:
+        """ Count finished rollouts, and show live output if it is time """
+        self.rollouts += rollouts
+        self.plies += plies
+        now = time.time()
+        if now - self.last_live >= self.live_interval:
+            self.last_live = now
+            self.write_live()
+
+    def summary(self) -> str:
+        """ Counters on one line, as "name value" pairs """
+        items = ["rollouts {}".format(self.rollouts),
+                 "plies {}".format(self.plies),
+                 "avg_length {:.1f}".format(self.plies / max(1, self.rollouts)),
+                 "adjudicated {}".format(self.adjudicated)]
+        items += ["time_{} {:.3f}".format(phase, self.times[phase]) for phase in PHASES]
+        classified = max(1, sum(self.policy_classes.values()))
+        items += ["{} {:.1%}".format(moveType, count / classified)
+                  for moveType, count in self.policy_classes.items() if count > 0]
+        return " ".join(items)
+
+    def write_live(self) -> None:
+        stderr.write("gogui-gfx:\nTEXT {}\n\n".format(self.summary()))
+        stderr.flush()
+
+
+# the telemetry of this process, shared by all players
+TELEMETRY = Telemetry()
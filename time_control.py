@@ -0,0 +1,160 @@
+"""
+time_control.py
+Time allocation for genmove.
+
+The budget for one move comes from the timelimit GTP command and from
+the game clock given by time_settings and time_left.
+Without either of them, genmove keeps its fixed number of simulations.
+
+Independent of the budget, the GTP stop and quit commands end a running
+search early through STOP_SEARCH; the searches test search_stopped
+wherever they test their deadline.
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+from board import GoBoard
+from board_base import BLACK, WHITE, GO_COLOR
+
+
+class TimeControl(object):
+    def __init__(self) -> None:
+        # hard limit in seconds for a single move, set by timelimit
+        self.timelimit: Optional[float] = None
+        # game clock, set by time_settings and time_left
+        self.main_time: Optional[float] = None
+        self.byo_yomi_time: float = 0.0
+        self.byo_yomi_stones: int = 0
+        self.time_left: Dict[GO_COLOR, float] = {}
+        self.stones_left: Dict[GO_COLOR, int] = {}
+        # time kept back for move generation overhead and the GTP reply
+        self.safety_margin: float = 0.05
+        # lower bound on the number of own moves still to be played
+        self.min_moves_left: int = 5
+
+    def is_active(self) -> bool:
+        return self.timelimit is not None or self.main_time is not None
+
+    def set_time_settings(self, main_time: float, byo_yomi_time: float,
+                          byo_yomi_stones: int) -> None:
+        """
+        GTP time_settings: main time, then byo-yomi_time seconds for every
+        byo_yomi_stones moves. byo_yomi_time > 0 and byo_yomi_stones == 0
+        means no time limit.
+        """
+        if byo_yomi_time > 0 and byo_yomi_stones == 0:
+            self.main_time = None
+            self.time_left = {}
+            self.stones_left = {}
+            return
+        self.main_time = main_time
+        self.byo_yomi_time = byo_yomi_time
+        self.byo_yomi_stones = byo_yomi_stones
+        for color in [BLACK, WHITE]:
+            if main_time > 0:
+                self.set_time_left(color, main_time, 0)
+            else:
+                self.set_time_left(color, byo_yomi_time, byo_yomi_stones)
+
+    def set_time_left(self, color: GO_COLOR, seconds: float, stones: int) -> None:
+        """
+        GTP time_left: seconds left for color, stones > 0 in byo-yomi
+        """
+        self.time_left[color] = seconds
+        self.stones_left[color] = stones
+
+    def move_budget(self, board: GoBoard, color: GO_COLOR) -> Optional[float]:
+        """
+        Seconds to spend on the next move of color, None without time control.
+        In main time the remaining time is spread over the expected number of
+        own moves, which is half the empty points. In byo-yomi the period is
+        spread over the stones still to be played in it.
+        """
+        budgets = []
+        if self.timelimit is not None:
+            budgets.append(self.timelimit)
+        if self.main_time is not None and color in self.time_left:
+            remaining = self.time_left[color]
+            stones = self.stones_left[color]
+            if stones > 0:
+                budgets.append(remaining / stones)
+            else:
+                moves_left = max(self.min_moves_left, (len(board.empty_points) + 1) // 2)
+                budget = remaining / moves_left
+                if self.byo_yomi_stones > 0:
+                    budget += self.byo_yomi_time / self.byo_yomi_stones
+                budgets.append(budget)
+        if not budgets:
+            return None
+        return max(0.0, min(budgets) - self.safety_margin)
+
+    def deadline(self, board: GoBoard, color: GO_COLOR,
+                 start: Optional[float] = None) -> Optional[float]:
+        """
+        Absolute time (as in time.time()) by which the move of color
+        must be chosen, None without time control.
+        """
+        budget = self.move_budget(board, color)
+        if budget is None:
+            return None
+        if start is None:
+            start = time.time()
+        return start + budget
+
+    def record_move_time(self, color: GO_COLOR, elapsed: float) -> None:
+        """
+        Update our own clock after a move, until the controller
+        sends the next time_left.
+        """
+        if self.main_time is None or color not in self.time_left:
+            return
+        self.time_left[color] -= elapsed
+        if self.stones_left[color] > 0:
+            self.stones_left[color] -= 1
+            if self.stones_left[color] == 0:
+                self.set_time_left(color, self.byo_yomi_time, self.byo_yomi_stones)
+        elif self.time_left[color] <= 0 and self.byo_yomi_stones > 0:
+            self.set_time_left(color, self.byo_yomi_time + self.time_left[color],
+                               self.byo_yomi_stones)
+
+
+class SearchStop(object):
+    """
+    Stop requests for the running search.
+    The GTP command thread calls begin before each command, and the GTP
+    reader thread calls request as soon as it reads stop or quit. So a
+    stop ends the command running when it is read, and no command that
+    is still queued: those run as usual.
+    """
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        # nonzero while the parent's search is stopped, in worker processes
+        self.shared_flag: Optional[np.ndarray] = None
+
+    def attach(self, shared_flag: np.ndarray) -> None:
+        """ Also follow a stop flag in shared memory, see parallel_simulation.py """
+        self.shared_flag = shared_flag
+
+    def begin(self) -> None:
+        """ A new command starts: earlier stop requests no longer apply """
+        self.event.clear()
+
+    def request(self) -> None:
+        """ Stop the command that is running now """
+        self.event.set()
+
+    def is_set(self) -> bool:
+        return self.event.is_set() or (self.shared_flag is not None and self.shared_flag[0] != 0)
+
+
+# stop requests of the GTP connection, shared by all searches of this process
+STOP_SEARCH = SearchStop()
+
+
+def search_stopped(deadline: Optional[float] = None) -> bool:
+    """ Whether a search must return now: stop was requested or deadline passed """
+    return STOP_SEARCH.is_set() or (deadline is not None and time.time() >= deadline)
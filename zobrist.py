@@ -0,0 +1,53 @@
+"""
+zobrist.py
+Random keys for Zobrist hashing of GoBoard positions.
+
+The hash of a position is the XOR of one key per stone, a key for
+WHITE to play, and one key per color for its capture count.
+There is one table per board size. It is built on first use from a fixed
+seed, so the keys are the same in every process and every run.
+"""
+
+import random
+from typing import Dict, List
+
+import numpy as np
+
+from board_base import BLACK, WHITE, board_array_size
+
+
+class ZobristTable(object):
+    def __init__(self, size: int) -> None:
+        rng = random.Random("zobrist-{}".format(size))
+        maxpoint = board_array_size(size)
+        # stones[color][point], the EMPTY row is all zero
+        self.stones: List[List[int]] = [[0] * maxpoint]
+        for _ in [BLACK, WHITE]:
+            self.stones.append([rng.getrandbits(64) for _ in range(maxpoint)])
+        self.white_to_move: int = rng.getrandbits(64)
+        # stones as an array indexed by board value, zero for EMPTY and BORDER,
+        # for hashing many positions at once
+        self.stone_array: np.ndarray = np.array(self.stones + [[0] * maxpoint], dtype=np.uint64)
+        # capture keys are made on demand, each color from its own generator,
+        # so key number n is the same whenever it is first needed
+        self._capture_rngs = [None] + [random.Random("zobrist-{}-captures-{}".format(size, color))
+                                       for color in [BLACK, WHITE]]
+        # a capture count of 0 has key 0, so the empty board hashes to 0
+        self._capture_keys: List[List[int]] = [[], [0], [0]]
+
+    def captures(self, color: int, count: int) -> int:
+        """ Key for color having captured count stones """
+        keys = self._capture_keys[color]
+        while len(keys) <= count:
+            keys.append(self._capture_rngs[color].getrandbits(64))
+        return keys[count]
+
+
+_tables: Dict[int, ZobristTable] = {}
+
+
+def get_zobrist_table(size: int) -> ZobristTable:
+    """ The shared table for boards of this size """
+    if size not in _tables:
+        _tables[size] = ZobristTable(size)
+    return _tables[size]